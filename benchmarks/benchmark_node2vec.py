@@ -0,0 +1,188 @@
+"""
+Throughput benchmarks for the node2vec pipeline on synthetic graphs.
+
+For every graph kind and size, we measure
+  * csf_load: reading the edge file into a CSFGraph (edges/sec)
+  * alias_preprocessing: setting up the alias tables of N2vGraph for each p/q setting (edges/sec)
+  * walks: simulating the random walks (walk steps/sec)
+  * batching: generating skip-gram training batches from the walks (examples/sec)
+  * training: running skip-gram optimization steps (words/sec, i.e., tokens of the walks processed per second,
+    as reported per epoch by Word2Vec.report_epochs)
+
+The results are written as JSON. If a baseline JSON file from a previous run is passed, the rates are
+compared with the baseline and the benchmark exits with an error if any rate dropped by more than
+the tolerance.
+
+Example:
+    python benchmarks/benchmark_node2vec.py --sizes 1000,10000 --output benchmark_results.json
+"""
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import click
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from xn2v import CSFGraph  # noqa: E402
+from xn2v import N2vGraph  # noqa: E402
+from xn2v import SkipGramWord2Vec  # noqa: E402
+from synthetic_graphs import GRAPH_KINDS, HET_NODE_FRACTIONS, write_graph  # noqa: E402
+
+
+def _record(results, graph, stage, seconds, items, unit, **kwargs):
+    """
+    Append the result of one measurement to the list of results and show it
+    """
+    rate = items / seconds if seconds > 0 else float('inf')
+    result = dict(graph, stage=stage, seconds=seconds, items=items, unit=unit, rate=rate)
+    result.update(kwargs)
+    results.append(result)
+    print("[BENCHMARK] {} {} edges {}: {:.2f} s, {:.1f} {}/s {}".format(
+        graph['kind'], graph['edges'], stage, seconds, rate, unit, kwargs if kwargs else ""))
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    return value, time.perf_counter() - start
+
+
+def benchmark_graph(results, kind, num_edges, graph_dir, pq_settings, gamma, use_gamma,
+                    num_walks, walk_length, batch_steps, train_steps, prefetch_depth, steps_per_call, backend, seed):
+    path = os.path.join(graph_dir, "{}_{}.graph".format(kind, num_edges))
+    written_edges = write_graph(kind, num_edges, path, seed=seed)
+    g, seconds = _timed(CSFGraph, path)
+    graph = {'kind': kind, 'requested_edges': num_edges, 'edges': written_edges, 'nodes': g.node_count()}
+    _record(results, graph, 'csf_load', seconds, written_edges, 'edges')
+    walks = None
+    for p, q in pq_settings:
+        n2v_graph, seconds = _timed(N2vGraph, g, p, q, gamma, use_gamma)
+        _record(results, graph, 'alias_preprocessing', seconds, g.edge_count(), 'edges', p=p, q=q)
+        walks, seconds = _timed(n2v_graph.simulate_walks, num_walks, walk_length)
+        steps = sum(len(w) - 1 for w in walks)
+        _record(results, graph, 'walks', seconds, steps, 'steps', p=p, q=q)
+    if walks is None or (batch_steps == 0 and train_steps == 0):
+        return
+    worddictionary = g.get_node_to_index_map()
+    reverse_worddictionary = g.get_index_to_node_map()
+    numberwalks = [[worddictionary[node] for node in w] for w in walks]
+    model = SkipGramWord2Vec(numberwalks, worddictionary=worddictionary,
+                             reverse_worddictionary=reverse_worddictionary, num_steps=train_steps,
+                             prefetch_depth=prefetch_depth, steps_per_call=steps_per_call, backend=backend)
+    examples = 0
+    start = time.perf_counter()
+    for _ in range(batch_steps):
+        batch_x, _ = model.batcher.generate_batch()
+        examples += len(batch_x)
+    seconds = time.perf_counter() - start
+    if batch_steps > 0:
+        _record(results, graph, 'batching', seconds, examples, 'examples')
+    if train_steps > 0:
+        _, seconds = _timed(model.train, display_step=train_steps)
+        # the words of the walks that the training steps cover: a pass through the walks (words_per_epoch words)
+        # consists of examples_per_epoch / batch_size steps
+        words = train_steps * model.batch_size * model.words_per_epoch / model.batcher.examples_per_epoch()
+        _record(results, graph, 'training', seconds, int(round(words)), 'words')
+
+
+def compare_with_baseline(results, baseline_path, tolerance):
+    """
+    Compare the rates with the rates of a previous run. Measurements are matched by graph kind,
+    requested number of edges, stage, and p/q
+    :return: list of descriptions of the measurements that got slower by more than the tolerance
+    """
+    def key(r):
+        return r['kind'], r['requested_edges'], r['stage'], r.get('p'), r.get('q')
+
+    with open(baseline_path) as f:
+        baseline = {key(r): r for r in json.load(f)['results']}
+    regressions = []
+    for r in results:
+        b = baseline.get(key(r))
+        if b is None or b['rate'] <= 0:
+            continue
+        ratio = r['rate'] / b['rate']
+        r['baseline_rate'] = b['rate']
+        if ratio < 1.0 - tolerance:
+            unit = r['unit']
+            regressions.append("{}: {:.1f} {}/s (baseline {:.1f} {}/s)".format(key(r), r['rate'], unit, b['rate'], unit))
+    return regressions
+
+
+@click.command()
+@click.option("--sizes", default="1000,10000,100000",
+              help="comma-separated numbers of edges, e.g. 1000,10000,100000,1000000,10000000")
+@click.option("--kinds", default=",".join(GRAPH_KINDS), help="comma-separated graph kinds")
+@click.option("--pq", "pq_settings", default="1:1,0.25:4,4:0.25", help="comma-separated p:q settings")
+@click.option("gamma", "-g", type=float, default=0.25,
+              help="probability of switching to each other node type; with --use-gamma it must be below 1/(number "
+                   "of node types) of the heterogeneous graph, so that the own node type keeps a positive probability")
+@click.option("--use-gamma/--no-use-gamma", "use_gamma", default=True, help="use the heterogeneous (xn2v) alias tables")
+@click.option("num_walks", "-n", type=int, default=1)
+@click.option("walk_length", "-w", type=int, default=80)
+@click.option("batch_steps", "-b", type=int, default=100, help="number of batches to generate")
+@click.option("train_steps", "-s", type=int, default=100, help="number of training steps (0 to skip)")
+@click.option("--prefetch-depth", "prefetch_depth", type=int, default=2,
+              help="number of batches generated ahead of training (0: synchronous)")
+@click.option("--steps-per-call", "steps_per_call", type=int, default=1,
+              help="number of training steps run in one call of the compiled training loop")
+@click.option("--backend", type=click.Choice(SkipGramWord2Vec.BACKENDS), default='tensorflow',
+              help="backend of the skip-gram training")
+@click.option("--seed", type=int, default=42)
+@click.option("--graph-dir", default=None, help="directory for the generated graphs (default: temporary)")
+@click.option("--output", "-o", default="benchmark_results.json")
+@click.option("--baseline", default=None, type=click.Path(exists=True), help="JSON results of a previous run")
+@click.option("--tolerance", type=float, default=0.2, help="maximum accepted relative slowdown")
+def main(sizes, kinds, pq_settings, gamma, use_gamma, num_walks, walk_length, batch_steps, train_steps,
+         prefetch_depth, steps_per_call, backend, seed, graph_dir, output, baseline, tolerance):
+    sizes = [int(s) for s in sizes.split(",")]
+    kinds = kinds.split(",")
+    if use_gamma and 'heterogeneous' in kinds and gamma >= 1.0 / len(HET_NODE_FRACTIONS):
+        # the probabilities of the own node type would be at most 0, which gives invalid alias tables
+        raise click.BadParameter("gamma must be below 1/{} with --use-gamma".format(len(HET_NODE_FRACTIONS)),
+                                 param_hint="-g")
+    pq_settings = [tuple(float(x) for x in pq.split(":")) for pq in pq_settings.split(",")]
+    if graph_dir is None:
+        graph_dir = tempfile.mkdtemp(prefix="xn2v_benchmark_")
+    results = []
+    for kind in kinds:
+        for num_edges in sizes:
+            benchmark_graph(results, kind, num_edges, graph_dir, pq_settings, gamma, use_gamma,
+                            num_walks, walk_length, batch_steps, train_steps, prefetch_depth, steps_per_call,
+                            backend, seed)
+    regressions = compare_with_baseline(results, baseline, tolerance) if baseline is not None else []
+    report = {
+        'metadata': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'num_walks': num_walks,
+            'walk_length': walk_length,
+            'gamma': gamma,
+            'use_gamma': use_gamma,
+            'prefetch_depth': prefetch_depth,
+            'steps_per_call': steps_per_call,
+            'backend': backend,
+        },
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Wrote benchmark results to {}".format(output))
+    if regressions:
+        print("[ERROR] Throughput regressions compared to {}:".format(baseline))
+        for regression in regressions:
+            print("  " + regression)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Generate synthetic graphs for the benchmarks. Each graph is written as an edge list file
+(node1 node2 weight) that can be read by CSFGraph. Self loops and duplicated edges are removed,
+and so the graphs can have slightly fewer edges than requested.
+"""
+import numpy as np
+import pandas as pd
+
+MAX_WEIGHT = 100
+
+# Fraction of nodes of each type in the heterogeneous graph (g: gene, p: protein, d: disease)
+HET_NODE_FRACTIONS = {'g': 0.5, 'p': 0.35, 'd': 0.15}
+# Fraction of edges between each pair of node types in the heterogeneous graph
+HET_EDGE_FRACTIONS = {('g', 'g'): 0.3, ('p', 'p'): 0.3, ('g', 'p'): 0.2, ('g', 'd'): 0.1, ('d', 'd'): 0.1}
+
+
+def _unique_undirected(node1, node2):
+    """
+    Remove self loops and duplicated (undirected) edges
+    """
+    keep = node1 != node2
+    node1 = node1[keep]
+    node2 = node2[keep]
+    pairs = np.unique(np.stack([np.minimum(node1, node2), np.maximum(node1, node2)], axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def erdos_renyi(num_nodes, num_edges, rng):
+    """
+    Uniform random graph G(n, m): both endpoints of each edge are chosen uniformly at random
+    :return: two arrays with the (integer) endpoints of the edges
+    """
+    node1 = rng.integers(0, num_nodes, num_edges)
+    node2 = rng.integers(0, num_nodes, num_edges)
+    return _unique_undirected(node1, node2)
+
+
+def power_law(num_nodes, num_edges, rng, exponent=2.5):
+    """
+    Chung-Lu random graph whose expected degrees follow a power law with the given exponent,
+    which resembles the degree distribution of scale-free networks such as protein-protein interactions
+    :return: two arrays with the (integer) endpoints of the edges
+    """
+    expected_degree = np.arange(1, num_nodes + 1) ** (-1.0 / (exponent - 1.0))
+    probs = expected_degree / np.sum(expected_degree)
+    node1 = rng.choice(num_nodes, size=num_edges, p=probs)
+    node2 = rng.choice(num_nodes, size=num_edges, p=probs)
+    return _unique_undirected(node1, node2)
+
+
+def heterogeneous(num_nodes, num_edges, rng):
+    """
+    Heterogeneous graph with genes, proteins, and diseases. The nodes of each type are numbered
+    from 0, and the edges between each pair of node types are chosen uniformly at random
+    :return: a list of (node1 labels, node2 labels) arrays, one entry per pair of node types
+    """
+    type_counts = {t: max(1, int(num_nodes * f)) for t, f in HET_NODE_FRACTIONS.items()}
+    edges = []
+    for (type1, type2), fraction in HET_EDGE_FRACTIONS.items():
+        n = int(num_edges * fraction)
+        node1 = rng.integers(0, type_counts[type1], n)
+        node2 = rng.integers(0, type_counts[type2], n)
+        if type1 == type2:
+            node1, node2 = _unique_undirected(node1, node2)
+        else:
+            pairs = np.unique(np.stack([node1, node2], axis=1), axis=0)
+            node1, node2 = pairs[:, 0], pairs[:, 1]
+        edges.append((np.char.add(type1, node1.astype(str)), np.char.add(type2, node2.astype(str))))
+    return edges
+
+
+GRAPH_KINDS = ['erdos_renyi', 'power_law', 'heterogeneous']
+
+
+def write_graph(kind, num_edges, path, seed=42, avg_degree=10):
+    """
+    Generate a graph of the given kind with (about) num_edges edges and write it to path
+    :param kind: one of 'erdos_renyi', 'power_law', 'heterogeneous'
+    :param num_edges: number of (undirected) edges to generate
+    :param path: output file
+    :param seed: seed of the random number generator (for reproducibility)
+    :param avg_degree: the number of nodes is chosen so that the average degree is about avg_degree
+    :return: number of edges that were written
+    """
+    rng = np.random.default_rng(seed)
+    num_nodes = max(10, 2 * num_edges // avg_degree)
+    if kind == 'erdos_renyi':
+        node1, node2 = erdos_renyi(num_nodes, num_edges, rng)
+        edges = [(np.char.add('n', node1.astype(str)), np.char.add('n', node2.astype(str)))]
+    elif kind == 'power_law':
+        node1, node2 = power_law(num_nodes, num_edges, rng)
+        edges = [(np.char.add('n', node1.astype(str)), np.char.add('n', node2.astype(str)))]
+    elif kind == 'heterogeneous':
+        edges = heterogeneous(num_nodes, num_edges, rng)
+    else:
+        raise TypeError("kind must be one of {}".format(GRAPH_KINDS))
+    node1 = np.concatenate([e[0] for e in edges])
+    node2 = np.concatenate([e[1] for e in edges])
+    weights = rng.integers(1, MAX_WEIGHT, len(node1))
+    df = pd.DataFrame({'node1': node1, 'node2': node2, 'weight': weights})
+    df.to_csv(path, index=False, sep="\t", header=False)
+    return len(df)
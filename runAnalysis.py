@@ -10,6 +10,7 @@ import xn2v
 from xn2v import CSFGraph
 from xn2v.word2vec import SkipGramWord2Vec
 from xn2v import LinkPrediction
+from xn2v import get_instrumentation
 
 @click.group()
 def cli():
@@ -29,9 +30,10 @@ def cli():
 @click.option("workers", "-r", type=int, default=8)
 @click.option("num_steps", "-s", type=int, default=100000)
 @click.option("display_step", "-d", type=int, default=1000)
+@click.option("report", "--report", default=None, help="write per-stage timing and memory report (JSON)")
 def disease_gene_embeddings(training_file, output_file, p, q, gamma, use_gamma,
                             walk_length, num_walks, dimensions, window_size, workers,
-                            num_steps, display_step):
+                            num_steps, display_step, report):
     """
     Generate disease gene embeddings
     """
@@ -59,6 +61,9 @@ def disease_gene_embeddings(training_file, output_file, p, q, gamma, use_gamma,
                              num_steps=num_steps)
     model.train(display_step=display_step)
     model.write_embeddings(output_file)
+    print(get_instrumentation().summary())
+    if report is not None:
+        get_instrumentation().write_report(report)
 
 @cli.command()
 
@@ -68,28 +73,30 @@ def disease_gene_embeddings(training_file, output_file, p, q, gamma, use_gamma,
 @click.option("negative_training_file", "-r", type=click.Path(exists=True), required=True)
 @click.option("embedded_graph", "-e", type=click.Path(exists=True), required=True)
 @click.option("edge_embedding_method", "-m", default="hadamard")
+@click.option("report", "--report", default=None, help="write per-stage timing and memory report (JSON)")
 def disease_link_prediction(positive_training_file,
                             positive_test_file,
                             negative_training_file,
                             negative_test_file,
                             embedded_graph,
-                            edge_embedding_method):
+                            edge_embedding_method,
+                            report):
     """
     Predict disease links
     """
 
-    training_graph = CSFGraph(positive_training_file)
-    test_graph = CSFGraph(positive_test_file)
-    negative_training_graph = CSFGraph(negative_training_file)
-    negative_test_graph = CSFGraph(negative_test_file)
-    lp = LinkPrediction(training_graph,
-                        test_graph,
-                        negative_training_graph,
-                        negative_test_graph,
+    # the edge files are read directly into arrays of embedding rows, without building CSFGraphs
+    lp = LinkPrediction(positive_training_file,
+                        positive_test_file,
+                        negative_training_file,
+                        negative_test_file,
                         embedded_graph,
                         edge_embedding_method=edge_embedding_method)
     lp.predict_links()
     lp.output_Logistic_Reg_results()
+    print(get_instrumentation().summary())
+    if report is not None:
+        get_instrumentation().write_report(report)
 
 
 
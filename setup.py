@@ -31,8 +31,9 @@ setup(
     license='BSD3',
     packages=['xn2v'],
     install_requires=[
-        'numpy>=1.16.4',
+        'numpy>=1.20',
         'pandas',
+        'scipy',
         'sklearn',
         'tensorflow>=2.0',
         'click'
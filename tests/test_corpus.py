@@ -0,0 +1,251 @@
+from unittest import TestCase
+
+import numpy as np
+
+from xn2v.corpus import BatchPrefetcher
+from xn2v.corpus import PAD
+from xn2v.corpus import SkipGramBatcherListOfLists
+from xn2v.corpus import UnigramTable
+from xn2v.corpus import keep_probabilities
+from xn2v.corpus import skip_gram_pairs
+from xn2v.corpus import subsample_walks
+from xn2v.corpus import token_counts
+from xn2v.corpus import tokens_to_array
+from xn2v.corpus import walks_to_array
+from xn2v.corpus import window_count
+
+
+class TestWalksToArray(TestCase):
+
+    def test_equal_lengths(self):
+        walks = walks_to_array([[1, 2, 3], [4, 5, 6]])
+        self.assertEqual(np.int32, walks.dtype)
+        self.assertEqual((2, 3), walks.shape)
+
+    def test_padding(self):
+        walks = walks_to_array([[1, 2, 3], [4]])
+        self.assertEqual([4, PAD, PAD], list(walks[1]))
+
+    def test_non_integer(self):
+        with self.assertRaises(TypeError):
+            walks_to_array([[1.5, 2.5], [3.5, 4.5]])
+
+    def test_tokens_to_array(self):
+        self.assertEqual((2, 2), tokens_to_array([[1, 2], [3]]).shape)
+        tokens = tokens_to_array([3, 1, 2])
+        self.assertEqual(np.int32, tokens.dtype)
+        self.assertEqual([3, 1, 2], list(tokens))
+        with self.assertRaises(TypeError):
+            tokens_to_array(['a', 'b'])
+        with self.assertRaises(TypeError):
+            tokens_to_array([[1, 2], [3, 'a']])
+
+
+class TestSkipGramPairs(TestCase):
+
+    def setUp(self):
+        list1 = [1, 3, 5, 7, 9, 11, 13, 15, 17, 19]
+        list2 = [2, 4, 6, 8, 10, 12, 14, 16, 18, 20]
+        self.walks = walks_to_array([list1, list2])
+
+    def test_pairs(self):
+        skip_window = 1
+        num_skips = 2
+        centers, contexts = skip_gram_pairs(self.walks, skip_window, num_skips, np.random.default_rng(42))
+        # each walk has 10-3+1=8 windows, each of which yields num_skips pairs
+        self.assertEqual(2 * 8 * num_skips, len(centers))
+        # with num_skips=2*skip_window, both neighbors of each center are used
+        self.assertEqual([3, 3, 5, 5], list(centers[:4]))
+        self.assertEqual({1, 5}, set(contexts[:2]))
+        self.assertEqual({3, 7}, set(contexts[2:4]))
+
+    def test_contexts_are_neighbors(self):
+        skip_window = 2
+        centers, contexts = skip_gram_pairs(self.walks, skip_window, 1, np.random.default_rng(42))
+        # the walks consist of numbers that differ by 2 from their neighbors
+        self.assertTrue(np.all(np.abs(centers - contexts) <= 2 * skip_window))
+        self.assertTrue(np.all(centers != contexts))
+
+    def test_short_walk(self):
+        walks = walks_to_array([[1, 2, 3, 4, 5], [6, 7]])
+        centers, contexts = skip_gram_pairs(walks, 1, 1)
+        # The second walk is too short for a window of size 3
+        self.assertEqual([2, 3, 4], list(centers))
+
+
+class TestSkipGramBatcher(TestCase):
+
+    def test_fixed_batch_size(self):
+        data = [list(range(i, i + 20)) for i in range(5)]
+        batcher = SkipGramBatcherListOfLists(data, batch_size=32, skip_window=2, num_skips=2, walks_per_block=2)
+        for _ in range(10):
+            batch, labels = batcher.generate_batch()
+            self.assertEqual((32,), batch.shape)
+            self.assertEqual((32, 1), labels.shape)
+            self.assertTrue(np.all(np.abs(batch - labels[:, 0]) <= 2))
+
+    def test_too_short(self):
+        with self.assertRaises(TypeError):
+            SkipGramBatcherListOfLists([[1, 2, 3], [4, 5, 6]], skip_window=3)
+
+
+class TestBatchPrefetcher(TestCase):
+
+    def setUp(self):
+        self.counter = 0
+
+    def generate_batch(self):
+        self.counter += 1
+        return self.counter
+
+    def test_prefetch(self):
+        with BatchPrefetcher(self.generate_batch, 10, queue_depth=3) as batches:
+            self.assertEqual(list(range(1, 11)), list(batches))
+
+    def test_synchronous(self):
+        batches = BatchPrefetcher(self.generate_batch, 5, queue_depth=0)
+        self.assertIsNone(batches.thread)
+        self.assertEqual(list(range(1, 6)), list(batches))
+
+    def test_close_early(self):
+        with BatchPrefetcher(self.generate_batch, 1000, queue_depth=2) as batches:
+            for batch in batches:
+                if batch == 3:
+                    break
+        self.assertIsNone(batches.thread)
+        # the producer can be at most queue_depth + 1 batches ahead
+        self.assertLessEqual(self.counter, 6)
+
+    def test_error(self):
+        def generate_batch():
+            raise ValueError("bad batch")
+        with BatchPrefetcher(generate_batch, 3, queue_depth=2) as batches:
+            with self.assertRaises(ValueError):
+                list(batches)
+
+    def test_base_exception(self):
+        class Stop(BaseException):
+            pass
+
+        def generate_batch():
+            raise Stop()
+        with BatchPrefetcher(generate_batch, 3, queue_depth=2) as batches:
+            with self.assertRaises(Stop):
+                list(batches)
+
+    def test_dead_producer(self):
+        class DeadPrefetcher(BatchPrefetcher):
+            def _produce(self):
+                # the thread ends without any batch or error
+                return
+        with DeadPrefetcher(self.generate_batch, 3, queue_depth=2) as batches:
+            with self.assertRaises(RuntimeError):
+                list(batches)
+
+
+class FixedUniform:
+    """
+    Stand-in for a numpy random Generator whose uniform numbers all have the given value
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def random(self, size):
+        return np.full(size, self.value)
+
+
+class TestUnigramTable(TestCase):
+
+    def test_token_counts(self):
+        walks = walks_to_array([[0, 1, 1, 3], [3, 3]])
+        self.assertEqual([1, 2, 0, 3, 0], list(token_counts(walks, 5)))
+
+    def test_table(self):
+        counts = np.array([1, 0, 16, 81])
+        table = UnigramTable(counts)
+        # counts^0.75 = 1, 0, 8, 27
+        self.assertTrue(np.allclose([1 / 36, 0, 8 / 36, 27 / 36], table.probabilities))
+        sample_counts = np.bincount(table.sample(100000, np.random.default_rng(42)), minlength=4)
+        self.assertEqual(0, sample_counts[1])
+        self.assertTrue(np.allclose(table.probabilities, sample_counts / 100000, atol=0.005))
+
+    def test_rare_token(self):
+        # token 0 has a probability of about 1e-9, far less than one entry of a table of 10^6 entries
+        table = UnigramTable(np.array([1, 2 ** 40, 0]))
+        self.assertGreater(table.probabilities[0], 0)
+        self.assertEqual([0, 0], list(table.sample(2, FixedUniform(table.probabilities[0] / 2))))
+        # the last token has no occurrences, and so it is not drawn even for the largest uniform number
+        self.assertEqual([1], list(table.sample(1, FixedUniform(np.nextafter(1.0, 0.0)))))
+
+    def test_sample(self):
+        table = UnigramTable(np.array([10, 0, 30]))
+        samples = table.sample((100, 5), np.random.default_rng(42))
+        self.assertEqual((100, 5), samples.shape)
+        self.assertFalse(np.any(samples == 1))
+        self.assertGreater(np.sum(samples == 2), np.sum(samples == 0))
+
+    def test_no_counts(self):
+        with self.assertRaises(TypeError):
+            UnigramTable(np.zeros(3))
+
+
+class TestSubsampling(TestCase):
+
+    def test_keep_probabilities(self):
+        counts = np.array([0, 1, 10, 989])
+        keep = keep_probabilities(counts, 0.01)
+        self.assertEqual(1.0, keep[0])
+        self.assertEqual(1.0, keep[1])
+        # f = 0.989, so that (sqrt(f/t) + 1) * t/f = 0.1106
+        self.assertAlmostEqual(0.1106, keep[3], places=3)
+
+    def test_subsample_walks(self):
+        walks = walks_to_array([[1, 2, 3, 4, 5], [6, 7, 8]])
+        keep = np.array([1, 1, 0, 1, 0, 1, 1, 1, 0], dtype=np.float64)
+        subsampled = subsample_walks(walks, keep, np.random.default_rng(42))
+        self.assertEqual(walks.shape, subsampled.shape)
+        self.assertEqual([1, 3, 5, PAD, PAD], list(subsampled[0]))
+        self.assertEqual([6, 7, PAD, PAD, PAD], list(subsampled[1]))
+
+    def test_batcher(self):
+        # token 0 is a hub that makes up half of the corpus
+        data = [[0 if j % 2 == 0 else 1 + (i + j) % 50 for j in range(20)] for i in range(50)]
+        batcher = SkipGramBatcherListOfLists(data, batch_size=64, skip_window=1, num_skips=1,
+                                             subsample_threshold=1e-3, seed=42)
+        centers = np.concatenate([batcher.generate_batch()[0].copy() for _ in range(20)])
+        self.assertLess(np.mean(centers == 0), 0.2)
+
+    def test_batcher_no_windows(self):
+        # all 9 tokens are frequent, so that subsampling leaves no walk with a window of 7 tokens
+        data = [[(i + j) % 9 for j in range(10)] for i in range(100)]
+        batcher = SkipGramBatcherListOfLists(data, batch_size=16, skip_window=3, num_skips=2,
+                                             subsample_threshold=1e-5, seed=42)
+        with self.assertRaises(TypeError):
+            batcher.generate_batch()
+
+
+class TestEpochs(TestCase):
+
+    def test_window_count(self):
+        walks = walks_to_array([[1, 2, 3, 4, 5], [6, 7]])
+        self.assertEqual(3, window_count(walks, 3))
+        # with a keep probability of 0.5, the expected lengths are 2.5 and 1
+        keep = np.full(8, 0.5)
+        self.assertEqual(0, window_count(walks, 3, keep))
+
+    def test_shuffle(self):
+        data = [list(range(i * 10, i * 10 + 10)) for i in range(6)]
+        batcher = SkipGramBatcherListOfLists(data, skip_window=1, num_skips=2, walks_per_block=4, shuffle=True,
+                                             seed=42)
+        self.assertEqual(6 * 8 * 2, batcher.examples_per_epoch())
+        first = batcher.next_walks(4)
+        # the second block ends with the last walk of the epoch
+        second = batcher.next_walks(4)
+        self.assertEqual(2, len(second))
+        self.assertEqual(1, batcher.epoch)
+        self.assertEqual(list(range(6)), sorted(np.concatenate([first[:, 0], second[:, 0]]) // 10))
+        # each epoch contains all walks, in a new order
+        third = np.concatenate([batcher.next_walks(4)[:, 0], batcher.next_walks(4)[:, 0]]) // 10
+        self.assertEqual(list(range(6)), sorted(third))
+        self.assertEqual(2, batcher.epoch)
@@ -1,5 +1,7 @@
 from unittest import TestCase
 import os.path
+import tempfile
+import numpy as np
 from xn2v import CSFGraph
 
 
@@ -77,3 +79,130 @@ class TestCSFGraph(TestCase):
         self.assertTrue(t2 in edge_list)
         made_up = ('z1', 'q123')
         self.assertFalse(made_up in edge_list)
+
+    def test_neighbor_index_range(self):
+        # The neighbors of g1 are d3, g2, g3, g4, p1
+        g1_idx = self.g.get_node_to_index_map()['g1']
+        start, end = self.g.neighbor_index_range(g1_idx, 'g')
+        nbrs = [self.g.get_index_to_node_map()[i] for i in self.g.edge_to[start:end]]
+        self.assertEqual(['g2', 'g3', 'g4'], nbrs)
+        start, end = self.g.neighbor_index_range(g1_idx, 'd')
+        nbrs = [self.g.get_index_to_node_map()[i] for i in self.g.edge_to[start:end]]
+        self.assertEqual(['d3'], nbrs)
+        # There are no nodes of type 'z' in the graph
+        start, end = self.g.neighbor_index_range(g1_idx, 'z')
+        self.assertEqual(start, end)
+
+    def test_node_index_range(self):
+        # The graph has 4 disease nodes, 4 gene nodes, and 4 protein nodes
+        start, end = self.g.node_index_range('g')
+        nodes = [self.g.get_index_to_node_map()[i] for i in range(start, end)]
+        self.assertEqual(['g1', 'g2', 'g3', 'g4'], nodes)
+
+    def test_neighbors_of_type(self):
+        # The neighbors of g2 are g1, g3, p1, p2
+        self.assertEqual(['p1', 'p2'], self.g.neighbors_of_type('g2', 'p'))
+        self.assertEqual([], self.g.neighbors_of_type('g2', 'd'))
+
+    def test_neighbor_type_counts(self):
+        # The neighbors of g1 are d3, g2, g3, g4, p1. The node types are sorted as d, g, p
+        g1_idx = self.g.get_node_to_index_map()['g1']
+        self.assertEqual(['d', 'g', 'p'], self.g.nodetypes)
+        self.assertEqual([1, 3, 1], list(self.g.neighbor_type_counts(g1_idx)))
+
+    def test_has_edges(self):
+        idx = self.g.get_node_to_index_map()
+        sources = [idx['p1'], idx['p3'], idx['g1'], idx['g1']]
+        dests = [idx['p3'], idx['p1'], idx['d3'], idx['d1']]
+        self.assertEqual([True, True, True, False], list(self.g.has_edges(sources, dests)))
+        self.assertEqual([self.g.has_edge('g1', 'd1')], list(self.g.has_edges([idx['g1']], [idx['d1']])))
+
+    def test_sample_negative_edges(self):
+        negatives = self.g.sample_negative_edges(20, seed=42)
+        self.assertEqual((20, 2), negatives.shape)
+        self.assertFalse(np.any(self.g.has_edges(negatives[:, 0], negatives[:, 1])))
+        self.assertFalse(np.any(negatives[:, 0] == negatives[:, 1]))
+        # every undirected pair occurs once
+        self.assertEqual(20, len(set(map(frozenset, negatives.tolist()))))
+        np.testing.assert_array_equal(negatives, self.g.sample_negative_edges(20, seed=42))
+
+    def test_sample_negative_edges_of_type(self):
+        negatives = self.g.sample_negative_edges(5, source_type='g', dest_type='d', degree_matched=True, seed=1)
+        labels = self.g.get_index_to_node_map()
+        self.assertTrue(all(labels[s][0] == 'g' and labels[d][0] == 'd' for s, d in negatives))
+        self.assertFalse(np.any(self.g.has_edges(negatives[:, 0], negatives[:, 1])))
+        # there are only 4 * 4 gene-disease pairs
+        with self.assertRaises(TypeError):
+            self.g.sample_negative_edges(100, source_type='g', dest_type='d')
+
+    def test_sample_negative_edges_overlapping_types(self):
+        # the sources of any type include the genes, so that a gene-gene pair can be drawn in both orientations (there
+        # are 21 pairs with a gene that are not edges)
+        labels = self.g.get_index_to_node_map()
+        for seed in range(5):
+            negatives = self.g.sample_negative_edges(20, dest_type='g', seed=seed)
+            self.assertTrue(all(labels[d][0] == 'g' for _, d in negatives))
+            self.assertFalse(np.any(self.g.has_edges(negatives[:, 0], negatives[:, 1])))
+            self.assertEqual(20, len(set(map(frozenset, negatives.tolist()))))
+
+    def test_from_edge_arrays(self):
+        source = np.repeat(np.arange(self.g.node_count()), np.diff(self.g.offset_to_edge_))
+        labels = [self.g.get_index_to_node_map()[i] for i in range(self.g.node_count())]
+        g = CSFGraph.from_edge_arrays(labels, source, self.g.edge_to, self.g.edge_weight)
+        np.testing.assert_array_equal(self.g.offset_to_edge_, g.offset_to_edge_)
+        np.testing.assert_array_equal(self.g.edge_to, g.edge_to)
+        np.testing.assert_array_equal(self.g.type_offset_to_edge_, g.type_offset_to_edge_)
+        self.assertEqual(self.g.get_node_to_index_map(), g.get_node_to_index_map())
+        self.assertEqual(dict(self.g.edgetype2count_dictionary), dict(g.edgetype2count_dictionary))
+
+    def test_split_edges(self):
+        training, test = self.g.split_edges(0.25, seed=42)
+        self.assertEqual(21, (training.edge_count() + test.edge_count()) // 2)
+        self.assertEqual(5, test.edge_count() // 2)
+        # the training graph is connected like the original graph and has all of its nodes
+        self.assertEqual(self.g.nodes(), training.nodes())
+        self.assertEqual(connected_components(self.g), connected_components(training))
+        for a, b in test.edges():
+            self.assertTrue(self.g.has_edge(a, b))
+            self.assertFalse(training.has_edge(a, b))
+        self.assertEqual(test.edges(), self.g.split_edges(0.25, seed=42)[1].edges())
+
+    def test_split_edges_of_type(self):
+        training, test = self.g.split_edges(0.5, edge_type='gp', seed=1)
+        self.assertGreater(test.edge_count(), 0)
+        self.assertTrue(all(sorted([a[0], b[0]]) == ['g', 'p'] for a, b in test.edges()))
+        self.assertEqual(connected_components(self.g), connected_components(training))
+
+    def test_split_edges_self_loops(self):
+        path = os.path.join(tempfile.mkdtemp(), 'self_loops.txt')
+        with open(path, 'w') as f:
+            f.write("a1\ta2\t1\na2\ta3\t1\na3\ta3\t1\na1\ta3\t1\na3\ta4\t1\na4\ta5\t1\na5\ta5\t1\n"
+                    "a2\ta5\t1\n")
+        g = CSFGraph(path)
+        for seed in range(10):
+            # half of the 6 edges between two nodes are requested, but the spanning tree keeps 4 of them
+            with self.assertLogs('xn2v.csf_graph.csf_graph', level='WARNING'):
+                training, test = g.split_edges(0.5, seed=seed)
+            self.assertEqual(2, test.edge_count() // 2)
+            self.assertTrue(all(a != b for a, b in test.edges()))
+            self.assertTrue(training.has_edge('a3', 'a3'))
+            self.assertTrue(training.has_edge('a5', 'a5'))
+
+
+def connected_components(g):
+    """
+    :return: number of connected components of g, by depth-first search
+    """
+    seen = set()
+    count = 0
+    for node in g.nodes():
+        if node in seen:
+            continue
+        count += 1
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            if n not in seen:
+                seen.add(n)
+                stack.extend(g.neighbors(n))
+    return count
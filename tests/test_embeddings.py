@@ -0,0 +1,85 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from xn2v.embeddings import EmbeddingStore
+from xn2v.embeddings import embedding_format
+from xn2v.embeddings import load_embeddings
+from xn2v.embeddings import save_embeddings
+
+
+class TestEmbeddings(TestCase):
+
+    def setUp(self):
+        self.labels = ['g1', 'g2', 'd 3', 'p4']
+        self.matrix = np.random.default_rng(42).standard_normal((4, 5)).astype(np.float32)
+        self.directory = tempfile.mkdtemp()
+
+    def round_trip(self, filename, file_format=None):
+        path = os.path.join(self.directory, filename)
+        save_embeddings(path, self.labels, self.matrix, file_format)
+        labels, matrix = load_embeddings(path, file_format)
+        self.assertEqual(np.float32, matrix.dtype)
+        np.testing.assert_array_equal(self.matrix, matrix)
+        return labels
+
+    def test_text(self):
+        self.assertEqual(self.labels, self.round_trip('embedding.txt'))
+        with open(os.path.join(self.directory, 'embedding.txt')) as f:
+            self.assertEqual(6, len(f.readline().split('\t')))
+
+    def test_npy(self):
+        self.assertEqual(self.labels, self.round_trip('embedding.npy'))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'embedding.labels')))
+
+    def test_word2vec(self):
+        # labels of the word2vec format cannot contain spaces
+        self.labels[2] = 'd3'
+        self.assertEqual(self.labels, self.round_trip('embedding.bin'))
+        self.assertEqual(self.labels, self.round_trip('embedding', 'word2vec'))
+
+    def test_format(self):
+        self.assertEqual('npy', embedding_format('a/b.NPY'))
+        self.assertEqual('word2vec', embedding_format('b.bin'))
+        self.assertEqual('text', embedding_format('b.emb'))
+        with self.assertRaises(TypeError):
+            embedding_format('b.txt', 'csv')
+
+    def test_mismatch(self):
+        with self.assertRaises(TypeError):
+            save_embeddings(os.path.join(self.directory, 'e.txt'), self.labels[:3], self.matrix)
+
+
+class TestEmbeddingStore(TestCase):
+
+    def setUp(self):
+        self.labels = ['g1', 'g2', 'd3', 'p4']
+        self.matrix = np.random.default_rng(42).standard_normal((4, 5)).astype(np.float32)
+        self.path = os.path.join(tempfile.mkdtemp(), 'embedding.npy')
+        save_embeddings(self.path, self.labels, self.matrix)
+
+    def test_mmap(self):
+        store = EmbeddingStore(self.path)
+        self.assertIsInstance(store.matrix, np.memmap)
+        self.assertEqual(4, len(store))
+        self.assertEqual(5, store.dimension)
+        self.assertIn('d3', store)
+        np.testing.assert_array_equal(self.matrix[[3, 0, 3]], store.get_rows(['p4', 'g1', 'p4']))
+        np.testing.assert_array_equal(self.matrix[1], store['g2'])
+        with self.assertRaises(KeyError):
+            store.get_rows(['g1', 'x'])
+
+    def test_text(self):
+        path = os.path.join(os.path.dirname(self.path), 'embedding.txt')
+        save_embeddings(path, self.labels, self.matrix)
+        store = EmbeddingStore(path)
+        np.testing.assert_array_equal(self.matrix[[2, 1]], store.get_rows(['d3', 'g2']))
+
+    def test_similarity(self):
+        store = EmbeddingStore(self.path)
+        similarity = store.similarity(['g1', 'g1'], ['g1', 'g2'])
+        self.assertAlmostEqual(1.0, similarity[0], places=5)
+        a, b = self.matrix[0], self.matrix[1]
+        self.assertAlmostEqual(np.dot(a, b) / np.linalg.norm(a) / np.linalg.norm(b), similarity[1], places=5)
@@ -0,0 +1,66 @@
+import json
+import os.path
+import tempfile
+from unittest import TestCase
+
+from xn2v import CSFGraph
+from xn2v import N2vGraph
+from xn2v import Instrumentation
+from xn2v.instrumentation import get_instrumentation, set_instrumentation
+
+
+class TestInstrumentation(TestCase):
+
+    def setUp(self):
+        self.previous = get_instrumentation()
+        self.instrumentation = Instrumentation()
+        set_instrumentation(self.instrumentation)
+        inputfile = os.path.join(os.path.dirname(__file__), 'data', 'small_graph.txt')
+        self.g = CSFGraph(inputfile)
+
+    def tearDown(self):
+        set_instrumentation(self.previous)
+
+    def test_stage(self):
+        with self.instrumentation.stage('test', unit='edges') as record:
+            record['items'] = 42
+        stage = self.instrumentation.stages[-1]
+        self.assertEqual('test', stage['stage'])
+        self.assertEqual(42, stage['items'])
+        self.assertTrue(stage['seconds'] >= 0)
+
+    def test_max_stages(self):
+        instrumentation = Instrumentation(max_stages=3)
+        for i in range(5):
+            with instrumentation.stage('stage{}'.format(i)):
+                pass
+        # only the last 3 stages are kept
+        self.assertEqual(['stage2', 'stage3', 'stage4'], [record['stage'] for record in instrumentation.stages])
+        self.assertEqual(3, len(instrumentation.report()['stages']))
+
+    def test_disabled(self):
+        instrumentation = Instrumentation(enabled=False)
+        with instrumentation.stage('test'):
+            pass
+        self.assertEqual(0, len(instrumentation.stages))
+
+    def test_pipeline_stages(self):
+        n2v_graph = N2vGraph(self.g, 1, 1, 1)
+        walks = n2v_graph.simulate_walks(2, 5)
+        stages = {record['stage']: record for record in self.instrumentation.stages}
+        # small_graph.txt has 21 edges, i.e., 42 directed edges
+        self.assertEqual(42, stages['CSFGraph.load']['items'])
+        self.assertEqual(42, stages['N2vGraph.preprocess_transition_probs_xn2v']['items'])
+        self.assertEqual(sum(len(w) for w in walks), stages['N2vGraph.simulate_walks']['items'])
+
+    def test_write_report(self):
+        path = os.path.join(tempfile.mkdtemp(), 'report.json')
+        self.instrumentation.write_report(path)
+        with open(path) as f:
+            report = json.load(f)
+        self.assertEqual('CSFGraph.load', report['stages'][0]['stage'])
+        self.assertIn('CSFGraph.load', self.instrumentation.summary())
+
+    def test_set_instrumentation_type(self):
+        with self.assertRaises(TypeError):
+            set_instrumentation("not an Instrumentation object")
@@ -0,0 +1,33 @@
+from unittest import TestCase
+
+import numpy as np
+
+from xn2v import kWord2Vec
+
+
+class TestKWord2VecSubsampling(TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # walks of 20 to 23 tokens, in which the hub token 0 makes up half of the corpus
+        self.data = [[0 if j % 2 == 0 else int(rng.integers(1, 30)) for j in range(20 + i % 4)] for i in range(40)]
+
+    def test_batches(self):
+        model = kWord2Vec(self.data, batch_size=32, skip_window=3, num_skips=2, subsample_threshold=1e-2, seed=42)
+        for _ in range(5):
+            batch, labels = model.next_batch_from_list_of_lists(2, 2, 3)
+            self.assertEqual(0, len(batch) % 2)
+            self.assertEqual((len(batch), 1), labels.shape)
+            batch, labels = model.batcher.generate_batch()
+            self.assertEqual((32,), batch.shape)
+            self.assertEqual((32, 1), labels.shape)
+
+    def test_resampled_per_pass(self):
+        model = kWord2Vec(self.data, skip_window=3, num_skips=2, subsample_threshold=1e-2, seed=42)
+        walk_count = len(self.data)
+        first, _ = model.next_batch_from_list_of_lists(walk_count, 2, 3)
+        second, _ = model.next_batch_from_list_of_lists(walk_count, 2, 3)
+        # the two passes through the walks keep different tokens
+        self.assertFalse(len(first) == len(second) and np.array_equal(first, second))
+        # the hub token is mostly discarded
+        self.assertLess(np.mean(first == 0), 0.3)
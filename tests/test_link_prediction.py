@@ -0,0 +1,168 @@
+import os.path
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+
+from xn2v import CSFGraph
+from xn2v import EmbeddingStore
+from xn2v import save_embeddings
+from xn2v.link_prediction import EDGE_EMBEDDING_METHODS
+from xn2v.link_prediction import LinkPrediction
+from xn2v.link_prediction import edge_embeddings
+from xn2v.link_prediction import read_edge_file
+from xn2v.link_prediction import top_k_bilinear
+from xn2v.link_prediction import top_k_candidates
+
+
+class TestEdgeEmbeddings(TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.matrix = rng.standard_normal((10, 4)).astype(np.float32)
+        self.src = rng.integers(0, 10, 25)
+        self.dst = rng.integers(0, 10, 25)
+
+    def test_methods(self):
+        a, b = self.matrix[self.src], self.matrix[self.dst]
+        expected = {'hadamard': a * b, 'average': (a + b) / 2, 'weightedL1': np.abs(a - b),
+                    'weightedL2': (a - b) ** 2}
+        for method in EDGE_EMBEDDING_METHODS:
+            # chunks of 7 edges give the same result as one chunk
+            for chunk_size in (7, 100):
+                result = edge_embeddings(self.matrix, self.src, self.dst, method, chunk_size)
+                np.testing.assert_allclose(expected[method], result, rtol=1e-6)
+
+    def test_unknown_method(self):
+        with self.assertRaises(TypeError):
+            edge_embeddings(self.matrix, self.src, self.dst, 'concatenate')
+
+    def test_transform(self):
+        labels = [str(i) for i in range(10)]
+        edges = [(labels[i], labels[j]) for i, j in zip(self.src, self.dst)]
+        lp = LinkPrediction.__new__(LinkPrediction)
+        lp.edge_embedding_method = 'weightedL1'
+        store = EmbeddingStore.from_arrays(labels, self.matrix)
+        expected = np.abs(self.matrix[self.src] - self.matrix[self.dst])
+        np.testing.assert_allclose(expected, lp.transform(edges, store))
+        # a dictionary of node vectors is still accepted
+        np.testing.assert_allclose(expected, lp.transform(edges, dict(zip(labels, self.matrix.tolist()))))
+        self.assertEqual((0, 4), lp.transform([], store).shape)
+
+
+class TestTopKCandidates(TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.matrix = rng.standard_normal((30, 4)).astype(np.float32)
+        self.sources = np.arange(0, 20)
+        self.targets = np.arange(20, 30)
+        self.weights = rng.standard_normal(4)
+
+    def score(self, x):
+        return x @ self.weights
+
+    def test_top_k(self):
+        src = np.tile(self.sources, len(self.targets))
+        dst = np.repeat(self.targets, len(self.sources))
+        all_scores = self.score(edge_embeddings(self.matrix, src, dst, 'hadamard')).reshape(len(self.targets), -1)
+        expected = np.argsort(-all_scores, axis=1)[:, :3]
+        # blocks of 7 candidates span several targets and split the candidates of a target
+        for chunk_size in (7, 1000):
+            best, scores = top_k_candidates(self.matrix, self.sources, self.targets, self.score, 'hadamard', k=3,
+                                            chunk_size=chunk_size)
+            np.testing.assert_array_equal(expected, best)
+            np.testing.assert_allclose(np.take_along_axis(all_scores, expected, axis=1), scores, rtol=1e-6)
+
+    def test_fewer_sources_than_k(self):
+        best, scores = top_k_candidates(self.matrix, self.sources[:2], self.targets, self.score, 'average', k=3)
+        self.assertEqual([-1] * len(self.targets), list(best[:, 2]))
+        self.assertTrue(np.all(np.isinf(scores[:, 2])))
+        self.assertEqual([0, 1], sorted(best[0, :2]))
+
+    def test_bilinear(self):
+        expected_best, expected_scores = top_k_candidates(self.matrix, self.sources, self.targets,
+                                                          lambda x: self.score(x) + 0.5, 'hadamard', k=5)
+        for tile_size in (3, 256):
+            best, scores = top_k_bilinear(self.matrix[self.sources], self.matrix[self.targets], self.weights,
+                                          bias=0.5, k=5, tile_size=tile_size)
+            np.testing.assert_array_equal(expected_best, best)
+            np.testing.assert_allclose(expected_scores, scores, rtol=1e-5)
+
+    def test_prioritize(self):
+        labels = ["n%d" % i for i in range(30)]
+        lp = LinkPrediction.__new__(LinkPrediction)
+        lp.edge_embedding_method = 'hadamard'
+        lp.map_node_vector = EmbeddingStore.from_arrays(labels, self.matrix)
+        lp.edge_classifier = LogisticRegression().fit(self.matrix[:20], np.arange(20) % 2)
+        ranking = lp.prioritize(labels[:20], labels[20:], k=4, chunk_size=16)
+        self.assertEqual(labels[20:], list(ranking.keys()))
+        probabilities = [p for _, p in ranking['n25']]
+        self.assertEqual(4, len(probabilities))
+        self.assertEqual(sorted(probabilities, reverse=True), probabilities)
+        # the bilinear scores of logistic regression give the same ranking as predict_proba
+        lp.edge_classifier = lp.edge_classifier.fit(edge_embeddings(self.matrix, np.arange(20), np.arange(10, 30),
+                                                                    'hadamard'), np.arange(20) % 2)
+        ranking = lp.prioritize(labels[:20], labels[20:], k=20)
+        features = edge_embeddings(self.matrix, np.arange(20), np.full(20, 25), 'hadamard')
+        expected = lp.edge_classifier.predict_proba(features)[:, 1]
+        sources = [int(source[1:]) for source, _ in ranking['n25']]
+        np.testing.assert_array_equal(np.argsort(-expected, kind='stable'), sources)
+        np.testing.assert_allclose(expected[sources], [p for _, p in ranking['n25']], rtol=1e-5)
+
+
+class TestEdgeFiles(TestCase):
+
+    def setUp(self):
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        self.train = os.path.join(data_dir, 'karate.train')
+        self.test = os.path.join(data_dir, 'karate.test')
+        directory = tempfile.mkdtemp()
+        labels = [str(i) for i in range(1, 35)]
+        self.embedding = os.path.join(directory, 'karate.npy')
+        save_embeddings(self.embedding, labels, np.random.default_rng(42).standard_normal((34, 8)))
+        # negative edges, written in both directions and with a duplicate
+        self.negative = os.path.join(directory, 'karate.negative')
+        with open(self.negative, 'w') as f:
+            f.write("5 30\n30 5\n7 25 1\n12 18\n12 18\n")
+
+    def test_read_edge_file(self):
+        index = {str(i): i - 1 for i in range(1, 35)}
+        edges = read_edge_file(self.negative, index)
+        self.assertEqual([[4, 29], [6, 24], [11, 17]], edges.tolist())
+
+    def test_paths_and_graphs(self):
+        lp = LinkPrediction(self.train, self.test, self.negative, self.negative, self.embedding, 'hadamard')
+        graph = CSFGraph(self.train)
+        self.assertEqual(graph.edge_count() // 2, len(lp.pos_train_edges))
+        lp_graphs = LinkPrediction(graph, CSFGraph(self.test), CSFGraph(self.negative), CSFGraph(self.negative),
+                                   self.embedding, 'hadamard')
+        np.testing.assert_array_equal(lp.pos_train_edges, lp_graphs.pos_train_edges)
+        np.testing.assert_array_equal(lp.neg_test_edges, lp_graphs.neg_test_edges)
+        lp.predict_links()
+        self.assertEqual(len(lp.pos_test_edges) + 3, len(lp.predictions))
+
+    def test_evaluate_grid(self):
+        lp = LinkPrediction(self.train, self.test, self.negative, self.negative, self.embedding, 'hadamard')
+        # enough negative edges for 2 folds
+        lp.neg_train_edges = np.stack([np.arange(0, 20), np.arange(10, 30)], axis=1)
+        classifiers = {'lr': LogisticRegression(), 'lr_weak': LogisticRegression(C=0.01)}
+        table = lp.evaluate_grid(methods=['hadamard', 'weightedL2'], classifiers=classifiers, folds=2, seed=1,
+                                 num_processes=2)
+        self.assertEqual([('hadamard', 'lr'), ('hadamard', 'lr_weak'), ('weightedL2', 'lr'), ('weightedL2', 'lr_weak')],
+                         list(zip(table['method'], table['classifier'])))
+        self.assertEqual([2] * 4, list(table['folds']))
+        self.assertTrue(np.all((table['roc_auc'] >= 0) & (table['roc_auc'] <= 1)))
+        self.assertTrue(np.all((table['test_roc_auc'] >= 0) & (table['test_roc_auc'] <= 1)))
+        # 2 folds and the test split per method and classifier
+        self.assertEqual(12, len(lp.grid_results))
+        # the folds are drawn from the training edges only, and the test split is evaluated as in predict_links
+        self.assertEqual(4, int(lp.grid_results['fold'].isna().sum()))
+        lp.predict_links()
+        test = table[(table['method'] == 'hadamard') & (table['classifier'] == 'lr')]
+        self.assertAlmostEqual(lp.test_roc, test['test_roc_auc'].iloc[0])
+        # the same folds give the same metrics in this process
+        serial = lp.evaluate_grid(methods=['hadamard', 'weightedL2'], classifiers=classifiers, folds=2, seed=1,
+                                  num_processes=1)
+        np.testing.assert_allclose(table['roc_auc'], serial['roc_auc'])
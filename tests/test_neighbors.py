@@ -0,0 +1,66 @@
+from unittest import TestCase
+
+import numpy as np
+
+from xn2v.neighbors import ExactIndex
+from xn2v.neighbors import LSHIndex
+from xn2v.neighbors import blocked_top_k
+
+
+class TestBlockedTopK(TestCase):
+
+    def test_blocks(self):
+        rng = np.random.default_rng(42)
+        queries, database = rng.standard_normal((5, 8)), rng.standard_normal((50, 8))
+        scores = queries @ database.T
+        expected = np.argsort(-scores, axis=1)[:, :4]
+        for block_size in (3, 7, 100):
+            rows, best = blocked_top_k(queries, database, k=4, block_size=block_size)
+            np.testing.assert_array_equal(expected, rows)
+            np.testing.assert_allclose(np.take_along_axis(scores, expected, axis=1), best, rtol=1e-5)
+
+    def test_padding(self):
+        rows, scores = blocked_top_k(np.ones((1, 2)), np.ones((2, 2)), k=3)
+        self.assertEqual(-1, rows[0, 2])
+        self.assertTrue(np.isinf(scores[0, 2]))
+
+
+class TestNeighborIndexes(TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        # 20 clusters of 50 points around random centers
+        centers = rng.standard_normal((20, 16))
+        self.matrix = np.repeat(centers, 50, axis=0) + 0.1 * rng.standard_normal((1000, 16))
+        self.labels = ["g%d" % i for i in range(1000)]
+        self.queries = centers[:5] + 0.1 * rng.standard_normal((5, 16))
+
+    def test_exact(self):
+        index = ExactIndex(self.matrix, labels=self.labels, block_size=128)
+        rows, similarities = index.query(self.queries, k=10)
+        normalized = self.matrix / np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        q = self.queries / np.linalg.norm(self.queries, axis=1, keepdims=True)
+        np.testing.assert_array_equal(np.argsort(-(q @ normalized.T), axis=1)[:, :10], rows)
+        # the neighbors of a query near the center of cluster i are the points of cluster i
+        self.assertTrue(np.all(rows // 50 == np.arange(5)[:, np.newaxis]))
+        neighbors = index.neighbors(self.queries[0], k=3)
+        self.assertEqual(1, len(neighbors))
+        self.assertEqual(["g%d" % row for row in rows[0, :3]], [label for label, _ in neighbors[0]])
+        self.assertAlmostEqual(float(similarities[0, 0]), neighbors[0][0][1], places=6)
+
+    def test_lsh(self):
+        exact, _ = ExactIndex(self.matrix).query(self.queries, k=10)
+        index = LSHIndex(self.matrix, labels=self.labels, num_tables=8, num_bits=8, seed=42)
+        rows, similarities = index.query(self.queries, k=10)
+        recall = np.mean([len(set(a) & set(b)) / 10.0 for a, b in zip(exact, rows)])
+        self.assertGreater(recall, 0.9)
+        # the results are ranked by their exact similarity
+        self.assertTrue(np.all(np.diff(similarities, axis=1) <= 0))
+        self.assertEqual(5, len(index.neighbors(self.queries, k=10)))
+
+    def test_lsh_padding(self):
+        # with one bit and no probing, a query only sees its own bucket
+        index = LSHIndex(np.array([[1.0, 0.0], [-1.0, 0.0]]), num_tables=1, num_bits=1, probe=False, seed=1)
+        rows, similarities = index.query(np.array([1.0, 0.1]), k=2)
+        self.assertEqual([0, -1], list(rows[0]))
+        self.assertTrue(np.isinf(similarities[0, 1]))
@@ -115,3 +115,32 @@ class TestHetGraph(TestCase):
         # recreate the original probabilities. They should be a vector of length 102 where all values are 10.0/102.0.
         # original_probs = calculate_total_probs(j_alias, q_alias)
         # self.assertAlmostEqual(10.0 / 1020.0, original_probs[self.d1index])
+
+
+class TestMetapathWalk(TestCase):
+
+    def setUp(self):
+        inputfile = os.path.join(os.path.dirname(__file__), 'data', 'small_graph.txt')
+        g = CSFGraph(inputfile)
+        self.n2v_graph = N2vGraph(g, 1, 1, 1)
+
+    def test_walk_follows_metapath(self):
+        metapath = 'gpgdg'
+        walk = self.n2v_graph.metapath_walk(walk_length=9, start_node='g1', metapath=metapath)
+        self.assertEqual('g1', walk[0])
+        # The walk stops early if it reaches a node without neighbors of the required type, e.g., g2 has no
+        # disease neighbor. Otherwise, it follows the pattern of node types of the metapath
+        self.assertTrue(3 <= len(walk) <= 9)
+        expected_types = ['g', 'p', 'g', 'd', 'g', 'p', 'g', 'd', 'g']
+        self.assertEqual(expected_types[:len(walk)], [node[0] for node in walk])
+
+    def test_simulate_metapath_walks(self):
+        walks = self.n2v_graph.simulate_metapath_walks(num_walks=2, walk_length=5, metapath='gdg')
+        # There are 4 gene nodes in small_graph.txt
+        self.assertEqual(8, len(walks))
+        for walk in walks:
+            self.assertEqual('g', walk[0][0])
+
+    def test_invalid_metapath(self):
+        with self.assertRaises(TypeError):
+            self.n2v_graph.simulate_metapath_walks(num_walks=1, walk_length=5, metapath='gpd')
@@ -0,0 +1,108 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from xn2v import SkipGramWord2Vec
+from xn2v.embeddings import load_embeddings
+from xn2v.sgns import SkipGramNegativeSampling
+from xn2v.sgns import scatter_add
+
+from .toy_corpus import ToyCorpusTestCase
+
+
+class TestScatterAdd(TestCase):
+
+    def test_duplicated_indices(self):
+        rng = np.random.default_rng(42)
+        matrix = rng.random((10, 4))
+        expected = matrix.copy()
+        indices = np.array([3, 1, 3, 7, 3, 1])
+        updates = rng.random((6, 4))
+        np.add.at(expected, indices, updates)
+        scatter_add(matrix, indices, updates)
+        self.assertTrue(np.allclose(expected, matrix))
+
+
+class TestSkipGramNegativeSampling(TestCase):
+
+    def setUp(self):
+        self.sgns = SkipGramNegativeSampling(vocabulary_size=50, embedding_size=8, learning_rate=0.5,
+                                             num_sampled=5, seed=42)
+
+    def test_shapes(self):
+        self.assertEqual((50, 8), self.sgns.embedding.shape)
+        self.assertEqual(np.float32, self.sgns.embedding.dtype)
+        self.assertEqual((3, 5), self.sgns.sample_negatives(3, self.sgns.rng).shape)
+
+    def test_loss_decreases(self):
+        centers = np.arange(0, 20, dtype=np.int32)
+        contexts = np.arange(20, 40, dtype=np.int32).reshape(-1, 1)
+        first_loss = self.sgns.train_batch(centers, contexts)
+        for _ in range(50):
+            loss = self.sgns.train_batch(centers, contexts)
+        self.assertLess(loss, first_loss)
+
+    def test_hogwild(self):
+        batches = [(np.arange(0, 20, dtype=np.int32), np.arange(20, 40, dtype=np.int32))] * 40
+        losses = []
+        steps = self.sgns.train(batches, num_threads=4, callback=lambda step, loss: losses.append(loss))
+        self.assertEqual(40, steps)
+        self.assertEqual(40, len(losses))
+        self.assertTrue(np.all(np.isfinite(self.sgns.embedding)))
+
+    def test_hogwild_reused_buffer(self):
+        buffer = (np.empty(20, dtype=np.int32), np.empty(20, dtype=np.int32))
+
+        def batches():
+            # every batch is the same buffer, which is overwritten with invalid words when the next batch is
+            # retrieved (while other threads may still train on the previous batch)
+            for _ in range(200):
+                buffer[0][:] = np.arange(0, 20)
+                buffer[1][:] = np.arange(20, 40)
+                yield buffer
+                buffer[0][:] = 10 ** 6
+                buffer[1][:] = 10 ** 6
+
+        self.assertEqual(200, self.sgns.train(batches(), num_threads=4))
+
+
+class TestNumpyBackend(ToyCorpusTestCase):
+
+    def test_train_and_write(self):
+        model = SkipGramWord2Vec(self.data, worddictionary=self.worddictionary,
+                                 reverse_worddictionary=self.reverse_worddictionary, batch_size=16,
+                                 num_steps=20, embedding_size=10, backend='numpy', num_threads=2)
+        model.train(display_step=10)
+        path = os.path.join(tempfile.mkdtemp(), 'embedding.txt')
+        model.write_embeddings(path)
+        with open(path) as f:
+            lines = f.readlines()
+        self.assertEqual(20, len(lines))
+        self.assertEqual(11, len(lines[0].split('\t')))
+        path = os.path.join(tempfile.mkdtemp(), 'embedding.npy')
+        model.write_embeddings(path)
+        labels, matrix = load_embeddings(path)
+        self.assertEqual([model.id2word[i] for i in range(20)], labels)
+        np.testing.assert_array_equal(model.embedding[:20], matrix)
+
+    def test_seed(self):
+        embeddings = []
+        for _ in range(2):
+            model = SkipGramWord2Vec(self.data, worddictionary=self.worddictionary,
+                                     reverse_worddictionary=self.reverse_worddictionary, batch_size=16,
+                                     num_steps=20, embedding_size=10, backend='numpy', seed=42)
+            model.train(display_step=None)
+            embeddings.append(model.embedding)
+        np.testing.assert_array_equal(embeddings[0], embeddings[1])
+
+    def test_steps_per_call(self):
+        with self.assertRaises(TypeError):
+            SkipGramWord2Vec(self.data, worddictionary=self.worddictionary,
+                             reverse_worddictionary=self.reverse_worddictionary, backend='numpy', steps_per_call=4)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(TypeError):
+            SkipGramWord2Vec(self.data, worddictionary=self.worddictionary,
+                             reverse_worddictionary=self.reverse_worddictionary, backend='torch')
@@ -1,9 +1,14 @@
 from unittest import TestCase
 
+import numpy as np
+
 from xn2v import CBOWBatcherListOfLists
 from xn2v import CSFGraph
 from xn2v import N2vGraph
 from xn2v import ContinuousBagOfWordsWord2Vec
+from xn2v import SkipGramWord2Vec
+
+from .toy_corpus import ToyCorpusTestCase
 
 
 
@@ -62,6 +67,46 @@ class TestTextEncoderSentences(TestCase):
         self.assertEqual(5, batch[0][1])
         self.assertEqual(3, labels[0])
 
+    def test_generate_batch_several_sentences(self):
+        data = [list(range(10)), list(range(100, 110)), list(range(200, 210))]
+        batcher = CBOWBatcherListOfLists(data, window_size=1, sentences_per_batch=2)
+        self.assertEqual(16, batcher.batch_size)
+        batch, labels = batcher.generate_batch()
+        self.assertEqual((16, 2), batch.shape)
+        self.assertEqual((16, 1), labels.shape)
+        # The 9th example is the first window of the second sentence
+        self.assertEqual([100, 102], list(batch[8]))
+        self.assertEqual(101, labels[8][0])
+        # The next batch consists of the third and the first sentence
+        batch, labels = batcher.generate_batch()
+        self.assertEqual([200, 202], list(batch[0]))
+        self.assertEqual([0, 2], list(batch[8]))
+
+    def test_subsampling(self):
+        data = [[0 if j % 2 == 0 else 1 + (i + j) % 50 for j in range(20)] for i in range(50)]
+        batcher = CBOWBatcherListOfLists(data, window_size=1, subsample_threshold=1e-3, seed=42)
+        self.assertEqual(18, batcher.batch_size)
+        for _ in range(10):
+            batch, labels = batcher.generate_batch()
+            self.assertEqual((18, 2), batch.shape)
+            self.assertEqual((18, 1), labels.shape)
+        # the hub word 0 occurs in half of the positions, but is mostly discarded
+        self.assertLess(np.mean(labels == 0), 0.3)
+
+    def test_subsampling_no_windows(self):
+        data = [[(i + j) % 9 for j in range(10)] for i in range(100)]
+        batcher = CBOWBatcherListOfLists(data, window_size=3, subsample_threshold=1e-5, seed=42)
+        with self.assertRaises(TypeError):
+            batcher.generate_batch()
+
+    def test_output_buffers(self):
+        batch1, _ = self.batcher.generate_batch()
+        batch2, _ = self.batcher.generate_batch()
+        self.assertIsNot(batch1, batch2)
+        # with two buffers, the third batch reuses the buffer of the first one
+        batch3, _ = self.batcher.generate_batch()
+        self.assertIs(batch1, batch3)
+
 
 class TestCBOWconstruction(TestCase):
     """
@@ -107,4 +152,86 @@ class TestCBOWconstruction(TestCase):
         num_skips = 1
         skip_window = 2
         batch = self.cbow.next_batch_from_list_of_lists(walk_count, num_skips, skip_window)
-        self.assertIsNotNone(batch)
\ No newline at end of file
+        self.assertIsNotNone(batch)
+
+class TestSkipGramTrainStep(ToyCorpusTestCase):
+
+    def setUp(self):
+        super(TestSkipGramTrainStep, self).setUp()
+        self.model = SkipGramWord2Vec(self.data, worddictionary=self.worddictionary,
+                                      reverse_worddictionary=self.reverse_worddictionary, batch_size=16, num_steps=5)
+
+    def test_train_step_traced_once(self):
+        self.model.train(display_step=10)
+        self.assertEqual(1, self.model.train_steps.experimental_get_tracing_count())
+
+    def test_steps_per_call(self):
+        self.model.steps_per_call = 2
+        batches_x, batches_y = self.model.next_training_chunk(2)
+        self.assertEqual((2, 16), batches_x.shape)
+        self.assertEqual((2, 16, 1), batches_y.shape)
+        # 5 steps are run as chunks of 2, 2, and 1 steps
+        with self.model.training_batches() as batches:
+            self.assertEqual([2, 2, 1], [len(batches_x) for batches_x, _ in batches])
+        self.model.train(display_step=10)
+        self.assertEqual(1, self.model.train_steps.experimental_get_tracing_count())
+
+    def test_chunk_longer_than_ring(self):
+        # A chunk has more steps than the batcher has output buffers, each of its batches must still be distinct
+        step_count = len(self.model.batcher.buffers) + 3
+        other = SkipGramWord2Vec(self.data, worddictionary=self.worddictionary,
+                                 reverse_worddictionary=self.reverse_worddictionary, batch_size=16, num_steps=5)
+        self.model.batcher.rng = np.random.default_rng(1)
+        other.batcher.rng = np.random.default_rng(1)
+        batches_x, batches_y = self.model.next_training_chunk(step_count)
+        for step in range(step_count):
+            batch_x, batch_y = other.next_training_batch()
+            np.testing.assert_array_equal(batch_x, batches_x[step])
+            np.testing.assert_array_equal(batch_y, batches_y[step])
+
+    def test_sparse_update(self):
+        batch_x, batch_y = self.model.next_training_batch()
+        before = self.model.embedding.numpy()
+        self.model.train_step(batch_x, batch_y)
+        after = self.model.embedding.numpy()
+        # Only the embeddings of the centers of the batch are updated
+        changed = set(np.flatnonzero(np.any(before != after, axis=1)))
+        self.assertTrue(changed)
+        self.assertTrue(changed.issubset(set(batch_x)))
+
+    def test_sample_negatives(self):
+        # all 20 words occur in the walks, and so each of them has a positive sampling probability
+        self.assertEqual(20, np.count_nonzero(self.model.unigram_table.probabilities))
+        _, labels = self.model.next_training_batch()
+        sampled, true_expected_count, sampled_expected_count = self.model.sample_negatives(labels)
+        self.assertEqual((self.model.num_sampled,), tuple(sampled.shape))
+        self.assertEqual((16, 1), tuple(true_expected_count.shape))
+        self.assertEqual((self.model.num_sampled,), tuple(sampled_expected_count.shape))
+
+    def test_epochs(self):
+        model = SkipGramWord2Vec(self.model.data, worddictionary=self.model.word2id,
+                                 reverse_worddictionary=self.model.id2word, batch_size=16, epochs=2)
+        # 10 walks with 12 - 7 + 1 = 6 windows and 2 pairs per window
+        self.assertEqual(120 // 16, model.steps_per_epoch)
+        self.assertEqual(2 * model.steps_per_epoch, model.num_steps)
+        self.assertEqual(120, model.words_per_epoch)
+        self.assertAlmostEqual(model.learning_rate, model.learning_rate_at(0))
+        self.assertAlmostEqual(model.learning_rate / 2, model.learning_rate_at(model.num_steps // 2), places=3)
+        model.train(display_step=100)
+        # the last step runs with the learning rate after num_steps - 1 steps
+        self.assertAlmostEqual(model.learning_rate_at(model.num_steps - 1), model.learning_rate_variable.numpy())
+
+
+class TestCBOWWindow(ToyCorpusTestCase):
+
+    def test_window_size_is_skip_window(self):
+        model = ContinuousBagOfWordsWord2Vec(self.data, worddictionary=self.worddictionary,
+                                             reverse_worddictionary=self.reverse_worddictionary, skip_window=3,
+                                             num_steps=5)
+        self.assertEqual(3, model.batcher.window_size)
+        # the context of each window has 2*skip_window words, which get_embedding averages
+        batch, labels = model.next_training_batch()
+        # one sentence of 12 words has 12 - 7 + 1 windows
+        self.assertEqual((12 - 7 + 1, 6), batch.shape)
+        self.assertEqual((len(batch), 1), labels.shape)
+        model.train(display_step=10)
@@ -0,0 +1,13 @@
+from unittest import TestCase
+
+
+class ToyCorpusTestCase(TestCase):
+    """
+    Base class of the tests that train on a small corpus: 10 walks of 12 words over a vocabulary of 20 words,
+    with the dictionaries between the words ('0' to '19') and their ids
+    """
+
+    def setUp(self):
+        self.data = [[(i * 7 + j) % 20 for j in range(12)] for i in range(10)]
+        self.worddictionary = {str(i): i for i in range(20)}
+        self.reverse_worddictionary = {i: str(i) for i in range(20)}
@@ -16,9 +16,21 @@ from .text_encoder import TextEncoder
 from .word2vec import CBOWBatcherListOfLists
 from .word2vec import ContinuousBagOfWordsWord2Vec
 from .word2vec import SkipGramWord2Vec
-from .kW2V import kWord2Vec
+try:
+    from .kW2V import kWord2Vec
+except ImportError:  # kWord2Vec requires TensorFlow
+    kWord2Vec = None
+from .embeddings import EmbeddingStore
+from .embeddings import load_embeddings
+from .embeddings import save_embeddings
+from .instrumentation import Instrumentation
+from .instrumentation import get_instrumentation
+from .neighbors import ExactIndex
+from .neighbors import LSHIndex
 
 __all__ = [
     "xn2vParser", "StringInteraction", "WeightedTriple", "N2vGraph", "LinkPrediction", "CSFGraph", "TextEncoder",
-    "CBOWBatcherListOfLists", "kWord2Vec", "ContinuousBagOfWordsWord2Vec", "SkipGramWord2Vec"
+    "CBOWBatcherListOfLists", "kWord2Vec", "ContinuousBagOfWordsWord2Vec", "SkipGramWord2Vec", "Instrumentation",
+    "get_instrumentation", "EmbeddingStore", "load_embeddings", "save_embeddings",
+    "ExactIndex", "LSHIndex"
 ]
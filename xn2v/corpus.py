@@ -0,0 +1,428 @@
+import queue
+import threading
+
+import numpy as np
+
+# Value used to pad walks that are shorter than the longest walk of the corpus
+PAD = -1
+
+
+def walks_to_array(data):
+    """
+    Convert a list of walks (lists of integer node indices, as we get from node2vec) into a 2D
+    int32 array with one walk per row. Walks that are shorter than the longest walk (for instance,
+    because the walk reached a node without neighbors) are padded at the end with PAD.
+    :param data: a list of lists of integers, or a 2D integer numpy array
+    :return: 2D numpy array of dtype int32
+    """
+    if isinstance(data, np.ndarray):
+        if data.ndim != 2 or data.dtype.kind not in 'iu':
+            raise TypeError("walks must be a 2D array of integers")
+        return data.astype(np.int32, copy=False)
+    if len(data) == 0:
+        raise TypeError("walks cannot be an empty list")
+    lengths = np.array([len(walk) for walk in data])
+    max_len = lengths.max()
+    if np.all(lengths == max_len):
+        walks = np.array(data)
+    else:
+        flat = np.concatenate([np.asarray(walk) for walk in data if len(walk) > 0])
+        walks = np.full((len(data), max_len), PAD, dtype=flat.dtype)
+        walks[np.arange(max_len) < lengths[:, np.newaxis]] = flat
+    if walks.dtype.kind not in 'iu':
+        raise TypeError("The item needs to be a list of walks where each walk is a sequence of (integer) nodes.")
+    return walks.astype(np.int32, copy=False)
+
+
+def tokens_to_array(data):
+    """
+    Convert a corpus into an int32 array, checking in one pass that all tokens are integers: a list of walks (or a
+    2D array) becomes a 2D array padded with PAD (see walks_to_array), and a flat list of tokens a 1D array
+    :param data: a list of lists of integers, a flat list of integers, or an integer numpy array
+    :return: numpy array of dtype int32
+    """
+    if isinstance(data, np.ndarray) and data.ndim == 2 or len(data) > 0 and isinstance(data[0], list):
+        return walks_to_array(data)
+    tokens = np.asarray(data)
+    if tokens.ndim != 1 or tokens.dtype.kind not in 'iu':
+        raise TypeError("data must be a list of integer tokens or a list of walks of integer nodes")
+    return tokens.astype(np.int32, copy=False)
+
+
+def take_walks(walks, start, walk_count):
+    """
+    :param walks: 2D array with one walk per row
+    :param start: index of the first walk to take
+    :param walk_count: number of walks to take. We rotate to the beginning of the array if we reach the end
+    :return: 2D array with walk_count walks
+    """
+    if start + walk_count <= len(walks):
+        return walks[start:start + walk_count]
+    return walks[np.arange(start, start + walk_count) % len(walks)]
+
+
+def keep_probabilities(counts, threshold):
+    """
+    Probability to keep each token when frequent tokens are subsampled (as in the original word2vec). A token whose
+    frequency f (count / total count) is above the threshold t is kept with probability (sqrt(f / t) + 1) * t / f,
+    and so hub nodes that dominate the walks are discarded most of the time, whereas rare tokens are always kept
+    :param counts: 1D array with the number of occurrences of each token (see token_counts)
+    :param threshold: the threshold t, typically between 1e-5 and 1e-3
+    :return: 1D float array with the probability to keep each token
+    """
+    if threshold <= 0:
+        raise TypeError("threshold must be positive")
+    counts = np.asarray(counts, dtype=np.float64)
+    frequencies = counts / np.sum(counts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        keep = (np.sqrt(frequencies / threshold) + 1) * threshold / frequencies
+    keep[counts == 0] = 1.0
+    return np.minimum(keep, 1.0)
+
+
+def subsample_walks(walks, keep, rng):
+    """
+    Discard each token of the walks with probability 1 - keep[token]. The remaining tokens of each walk are moved
+    to the front (so that the context windows span the discarded tokens) and the walks are padded with PAD
+    :param walks: 2D int32 array with one walk per row (padded with PAD)
+    :param keep: 1D array with the probability to keep each token (see keep_probabilities)
+    :param rng: numpy random Generator
+    :return: 2D int32 array with the subsampled walks, with the same shape as walks
+    """
+    valid = walks != PAD
+    mask = valid & (rng.random(walks.shape) < keep[np.where(valid, walks, 0)])
+    # position of each kept token in its subsampled walk
+    positions = np.cumsum(mask, axis=1) - 1
+    subsampled = np.full(walks.shape, PAD, dtype=np.int32)
+    rows = np.broadcast_to(np.arange(len(walks))[:, np.newaxis], walks.shape)
+    subsampled[rows[mask], positions[mask]] = walks[mask]
+    return subsampled
+
+
+def window_count(walks, span, keep=None):
+    """
+    :param walks: 2D int32 array with one walk per row (padded with PAD)
+    :param span: size of the windows
+    :param keep: optional probabilities to keep each token (see keep_probabilities), in which case the expected
+    number of windows of the subsampled walks is returned (approximately, based on the expected walk lengths)
+    :return: number of windows of size span that lie completely within a walk
+    """
+    valid = walks != PAD
+    if keep is None:
+        lengths = np.count_nonzero(valid, axis=1)
+    else:
+        lengths = np.sum(np.where(valid, keep[np.where(valid, walks, 0)], 0.0), axis=1)
+    return int(np.sum(np.maximum(lengths - span + 1, 0)))
+
+
+def skip_gram_pairs(walks, skip_window, num_skips, rng=None):
+    """
+    Generate all (center, context) skip-gram pairs for a block of walks. Every position of a walk whose
+    sliding window [ skip_window center skip_window ] lies completely within the walk is used as a center,
+    and for every center we choose num_skips distinct context positions at random from the 2*skip_window
+    positions that surround it.
+    :param walks: 2D int32 array with one walk per row (padded with PAD)
+    :param skip_window: How many words to consider left and right
+    :param num_skips: How many context words to choose for each center word
+    :param rng: numpy random Generator (a new one is created if None)
+    :return: two 1D int32 arrays with the centers and the contexts of the pairs
+    """
+    if num_skips > 2 * skip_window:
+        raise TypeError("num_skips cannot be larger than 2*skip_window")
+    span = 2 * skip_window + 1
+    if walks.shape[1] < span:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    # windows[i, j] is the window of walk i that is centered at position j + skip_window
+    windows = np.lib.stride_tricks.sliding_window_view(walks, span, axis=1)
+    # Walks are padded at the end, and so a window lies within the walk if its last element is not padding
+    windows = windows[windows[:, :, -1] != PAD]
+    context_positions = np.array([j for j in range(span) if j != skip_window])
+    if rng is None:
+        rng = np.random.default_rng()
+    # sort random keys to draw num_skips context positions without replacement for every window
+    keys = rng.random((len(windows), len(context_positions)))
+    chosen = context_positions[np.argsort(keys, axis=1)[:, :num_skips]]
+    contexts = np.take_along_axis(windows, chosen, axis=1).ravel()
+    centers = np.repeat(windows[:, skip_window], num_skips)
+    return centers, contexts
+
+
+class SkipGramBatcherListOfLists:
+    """
+    Generate fixed-size batches of (center, context) pairs for the skip-gram model from a list of
+    lists of ints, such as we get from node2vec. The pairs are generated for a block of walks at a time
+    with numpy operations on the int32 walk matrix (see skip_gram_pairs), and the batches are written
+    to a ring of preallocated arrays.
+    """
+
+    def __init__(self, data, batch_size=128, skip_window=3, num_skips=2, walks_per_block=256,
+                 num_buffers=2, subsample_threshold=None, shuffle=False, seed=None):
+        """
+        :param data: a list of lists of integers, representing sentences/random walks
+        :param batch_size: number of (center, context) pairs per batch
+        :param skip_window: How many words to consider left and right
+        :param num_skips: How many context words to choose for each center word
+        :param walks_per_block: number of walks from which pairs are generated at once
+        :param num_buffers: number of preallocated output buffers. A batch returned by generate_batch is
+        overwritten num_buffers calls later, and so callers that hold on to batches (e.g., a prefetching
+        queue) need to use enough buffers
+        :param subsample_threshold: if not None, frequent tokens are subsampled with this threshold before the pairs
+        are generated (see keep_probabilities)
+        :param shuffle: if True, the order of the walks is shuffled in each epoch (pass through all walks)
+        :param seed: seed for the random choice of context words (and the subsampling and shuffling)
+        """
+        if num_skips > 2 * skip_window:
+            raise TypeError("num_skips cannot be larger than 2*skip_window")
+        if num_buffers < 1:
+            raise TypeError("num_buffers must be at least 1")
+        self.walks = walks_to_array(data)
+        self.batch_size = batch_size
+        self.skip_window = skip_window
+        self.num_skips = num_skips
+        self.walks_per_block = walks_per_block
+        self.rng = np.random.default_rng(seed)
+        self.walk_index = 0  # index of the walk that will be used next for pair generation
+        self.shuffle = shuffle
+        self.epoch = 0  # number of completed passes through the walks
+        self.centers = np.empty(0, dtype=np.int32)
+        self.contexts = np.empty(0, dtype=np.int32)
+        self.pair_index = 0  # index of the next pair of self.centers/self.contexts to put in a batch
+        self.buffers = [(np.empty(batch_size, dtype=np.int32), np.empty((batch_size, 1), dtype=np.int32))
+                        for _ in range(num_buffers)]
+        self.buffer_index = 0
+        self.keep_probabilities = None
+        if subsample_threshold is not None:
+            self.keep_probabilities = keep_probabilities(token_counts(self.walks), subsample_threshold)
+        span = 2 * skip_window + 1
+        if self.walks.shape[1] < span or np.all(self.walks[:, span - 1] == PAD):
+            raise TypeError("Walks are too short to generate pairs with skip_window={}".format(skip_window))
+
+    def next_walks(self, walk_count):
+        """Return the next walk_count walks, or fewer at the end of the walks so that a block of walks does not span
+        two epochs. Rotate to the beginning of the data (shuffled if shuffle is True) if we are at the end.
+        """
+        walks = self.walks[self.walk_index:self.walk_index + walk_count]
+        self.walk_index += len(walks)
+        if self.walk_index == len(self.walks):
+            self.walk_index = 0
+            self.epoch += 1
+            if self.shuffle:
+                self.walks = self.walks[self.rng.permutation(len(self.walks))]
+        return walks
+
+    def examples_per_epoch(self):
+        """
+        :return: the number of (center, context) pairs of one pass through the walks (the expected number if the
+        walks are subsampled)
+        """
+        return window_count(self.walks, 2 * self.skip_window + 1, self.keep_probabilities) * self.num_skips
+
+    def generate_pairs(self, walk_count):
+        """
+        :param walk_count: number of walks (sentences) to ingest
+        :return: all (center, context) pairs of the next walk_count walks
+        """
+        walks = self.next_walks(walk_count)
+        if self.keep_probabilities is not None:
+            walks = subsample_walks(walks, self.keep_probabilities, self.rng)
+        return skip_gram_pairs(walks, self.skip_window, self.num_skips, self.rng)
+
+    def generate_batch(self):
+        """
+        Generate the next batch of batch_size pairs. The batch is written to the next preallocated buffer
+        :return: batch (centers) with shape (batch_size,) and labels (contexts) with shape (batch_size, 1)
+        """
+        batch, labels = self.buffers[self.buffer_index]
+        self.buffer_index = (self.buffer_index + 1) % len(self.buffers)
+        filled = 0
+        walk_count = min(self.walks_per_block, len(self.walks))
+        empty_blocks = 0
+        while filled < self.batch_size:
+            if self.pair_index == len(self.centers):
+                # With subsampling, a block may have no walk that is long enough for a window. If no block of a
+                # full pass through the walks has a pair, the subsampled walks are too short to fill a batch
+                if empty_blocks == -(-len(self.walks) // walk_count):
+                    raise TypeError("No pairs with skip_window={} in a full pass through the subsampled walks (is "
+                                    "subsample_threshold too low?)".format(self.skip_window))
+                self.centers, self.contexts = self.generate_pairs(walk_count)
+                self.pair_index = 0
+                empty_blocks = empty_blocks + 1 if len(self.centers) == 0 else 0
+            n = min(self.batch_size - filled, len(self.centers) - self.pair_index)
+            batch[filled:filled + n] = self.centers[self.pair_index:self.pair_index + n]
+            labels[filled:filled + n, 0] = self.contexts[self.pair_index:self.pair_index + n]
+            self.pair_index += n
+            filled += n
+        return batch, labels
+
+
+def cbow_examples(walks, window_size, batch=None, labels=None):
+    """
+    Generate the CBOW examples of a block of walks. Every window [ window_size target window_size ] that lies within
+    a walk gives one example, whose context is the window without the center column.
+    :param walks: 2D int32 array with one walk per row (padded with PAD)
+    :param window_size: How many words to consider left and right of the target word
+    :param batch: optional preallocated int32 array of shape (n, 2*window_size) for the contexts, where n is the
+    number of examples (walks.shape[0] * (walks.shape[1] - 2*window_size) for walks without padding)
+    :param labels: optional preallocated array of shape (n, 1) for the targets
+    :return: contexts (batch) with shape (n, 2*window_size) and targets (labels) with shape (n, 1). The windows are
+    copied from the walks to a temporary array of shape (n, 2*window_size+1) even if batch and labels are given
+    """
+    span = 2 * window_size + 1
+    if walks.shape[1] < span:
+        return np.empty((0, span - 1), dtype=np.int32), np.empty((0, 1), dtype=np.int64)
+    # windows[i*m + j] is the window of walk i that is centered at position j + window_size
+    windows = np.lib.stride_tricks.sliding_window_view(walks, span, axis=1).reshape(-1, span)
+    if np.any(walks[:, -1] == PAD):
+        # Walks are padded at the end, and so a window lies within the walk if its last element is not padding
+        windows = windows[windows[:, -1] != PAD]
+    context_columns = np.array([j for j in range(span) if j != window_size])
+    if batch is None:
+        batch = np.empty((len(windows), span - 1), dtype=np.int32)
+    if labels is None:
+        labels = np.empty((len(windows), 1), dtype=np.int64)
+    np.take(windows, context_columns, axis=1, out=batch)
+    labels[:, 0] = windows[:, window_size]
+    return batch, labels
+
+
+class _BatchError:
+    """Wrap an exception (any BaseException) raised while generating a batch in the background thread"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class BatchPrefetcher:
+    """
+    Iterate over num_batches batches that are generated in a background thread and handed over through a
+    bounded queue, so that the preparation of the next batches overlaps the optimization step of the current
+    batch (numpy and TensorFlow release the GIL in their kernels). With queue_depth=0, the batches are generated
+    synchronously in the calling thread. For instance,
+
+        with BatchPrefetcher(batcher.generate_batch, num_steps, queue_depth=2) as batches:
+            for batch, labels in batches:
+                run_optimization(batch, labels)
+
+    Note that if generate_batch writes to a ring of preallocated buffers, the ring needs at least queue_depth + 2
+    buffers (the batches in the queue, the batch being used by the caller and the batch being generated).
+    """
+
+    def __init__(self, generate_batch, num_batches, queue_depth=2):
+        """
+        :param generate_batch: function without arguments that returns the next batch
+        :param num_batches: number of batches to generate
+        :param queue_depth: maximum number of batches that are generated ahead of the caller
+        """
+        if queue_depth < 0:
+            raise TypeError("queue_depth cannot be negative")
+        self.generate_batch = generate_batch
+        self.num_batches = num_batches
+        self.queue_depth = queue_depth
+        self.queue = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        if queue_depth > 0:
+            self.queue = queue.Queue(maxsize=queue_depth)
+            self.thread = threading.Thread(target=self._produce, daemon=True)
+            self.thread.start()
+
+    def _put(self, item):
+        """Put item in the queue unless the prefetcher was closed. Return False if it was closed
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            for _ in range(self.num_batches):
+                if not self._put(self.generate_batch()):
+                    return
+        except BaseException as e:
+            # also forward, e.g., KeyboardInterrupt or SystemExit, which would otherwise end the thread silently
+            self._put(_BatchError(e))
+
+    def _get(self):
+        """Return the next item of the queue. Raise RuntimeError if the background thread ended without putting it
+        """
+        while True:
+            try:
+                return self.queue.get(timeout=0.1)
+            except queue.Empty:
+                if not self.thread.is_alive():
+                    # the thread may have put its last item just before it ended
+                    try:
+                        return self.queue.get_nowait()
+                    except queue.Empty:
+                        raise RuntimeError("the batch prefetching thread ended before all batches were generated")
+
+    def __iter__(self):
+        for _ in range(self.num_batches):
+            if self.thread is None:
+                yield self.generate_batch()
+                continue
+            item = self._get()
+            if isinstance(item, _BatchError):
+                raise item.error
+            yield item
+
+    def close(self):
+        """Stop the background thread (if any), e.g., if the caller stops before all batches were used
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def token_counts(walks, vocabulary_size=None):
+    """
+    Count how often each token (node) occurs in the corpus
+    :param walks: 2D int array with one walk per row (padded with PAD), or a 1D int array of tokens
+    :param vocabulary_size: minimum length of the result, e.g., to include tokens that do not occur
+    :return: 1D int64 array, where entry i is the number of occurrences of token i
+    """
+    walks = np.asarray(walks)
+    return np.bincount(walks[walks != PAD].ravel(), minlength=0 if vocabulary_size is None else vocabulary_size)
+
+
+class UnigramTable:
+    """
+    Sampling distribution of the negative examples, in which the probability of each token is proportional to its
+    count raised to the power of 0.75 (as in the original word2vec). Drawing a negative is a binary search of a
+    uniformly random number in the cumulative distribution, which is exact for every token with a positive count,
+    also for tokens whose probability is too small for a slot in a fixed-size table of the original word2vec.
+    """
+
+    def __init__(self, counts, power=0.75):
+        """
+        :param counts: 1D array with the number of occurrences of each token (see token_counts)
+        :param power: the counts are raised to this power, which flattens the distribution a little
+        """
+        counts = np.asarray(counts, dtype=np.float64)
+        if counts.ndim != 1 or np.sum(counts) <= 0:
+            raise TypeError("counts must be a 1D array with at least one positive count")
+        weights = counts ** power
+        self.probabilities = weights / np.sum(weights)
+        # token j is drawn for the uniform numbers in [cumulative[j-1], cumulative[j]), which is empty for tokens
+        # without occurrences
+        self.cumulative = np.cumsum(self.probabilities)
+        self.cumulative[-1] = 1.0
+
+    def sample(self, size, rng):
+        """
+        :param size: shape of the result
+        :param rng: numpy random Generator
+        :return: int32 array with tokens drawn from the unigram^power distribution
+        """
+        return np.searchsorted(self.cumulative, rng.random(size), side='right').astype(np.int32)
@@ -1,7 +1,13 @@
+import logging
 import os.path
 import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import minimum_spanning_tree
 from collections import defaultdict
 from .edge import Edge
+from ..instrumentation import instrumented
+
+log = logging.getLogger(__name__)
 
 
 class CSFGraph:
@@ -9,6 +15,7 @@ class CSFGraph:
     Compressed Storage Format graph class (cannot be modified after graph construction)
     """
 
+    @instrumented('CSFGraph.load', items=lambda g, _: g.edge_count(), unit='edges')
     def __init__(self, filepath):
         if filepath is None:
             raise TypeError("Need to pass path of file with edges")
@@ -102,6 +109,86 @@ class CSFGraph:
             self.edge_to[j] = dest_index
             self.edge_weight[j] = edge.weight
             j += 1
+        self.__compute_type_offsets()
+        # sorted keys source * node_count + destination of all edges, computed on demand (see edge_keys)
+        self.edge_keys_ = None
+
+    @classmethod
+    def from_edge_arrays(cls, labels, source_idx, dest_idx, weights=None):
+        """
+        Build a graph directly from arrays of undirected edges, without writing and parsing an edge file. As for
+        an edge file, each edge is added in both directions, and the graph has the nodes of the edges
+        :param labels: list with the label of each node index that occurs in source_idx and dest_idx (e.g., the
+        labels of the nodes of another CSFGraph, in the order of their indices)
+        :param source_idx: 1D int array with the index of the first node of each edge
+        :param dest_idx: 1D int array with the index of the second node of each edge
+        :param weights: 1D array with the weight of each edge (default: 1)
+        :return: CSFGraph
+        """
+        source_idx = np.asarray(source_idx, dtype=np.int64)
+        dest_idx = np.asarray(dest_idx, dtype=np.int64)
+        if weights is None:
+            weights = np.ones(len(source_idx))
+        # the nodes of the graph are the nodes of the edges, and their indices follow the sorted labels
+        used = np.unique(np.concatenate([source_idx, dest_idx]))
+        node_list = sorted(labels[i] for i in used)
+        node_index = {node: i for i, node in enumerate(node_list)}
+        new_index = np.fromiter((node_index[labels[i]] for i in used), dtype=np.int64, count=len(used))
+        node_count = len(node_list)
+        source = new_index[np.searchsorted(used, source_idx)]
+        dest = new_index[np.searchsorted(used, dest_idx)]
+        # both directions of each edge, without duplicates, sorted by source and destination (the order of the CSR)
+        keys, first = np.unique(np.concatenate([source * node_count + dest, dest * node_count + source]),
+                                return_index=True)
+        all_weights = np.concatenate([weights, weights])[first]
+        source, dest = np.divmod(keys, node_count)
+        graph = cls.__new__(cls)
+        graph.node_to_index_map = defaultdict(int)
+        graph.index_to_node_map = defaultdict(str)
+        for i, node in enumerate(node_list):
+            graph.node_to_index_map[node] = i
+            graph.index_to_node_map[i] = node
+        graph.edge_to = dest.astype(np.int32)
+        graph.edge_weight = all_weights.astype(np.int32)
+        graph.offset_to_edge_ = np.zeros(node_count + 1, dtype=np.int32)
+        graph.offset_to_edge_[1:] = np.cumsum(np.bincount(source, minlength=node_count))
+        graph.nodetype2count_dictionary = defaultdict(int)
+        for node in node_list:
+            graph.nodetype2count_dictionary[node[0]] += 1
+        graph.edgetype2count_dictionary = defaultdict(int)
+        undirected = source <= dest
+        for a, b in zip(source[undirected], dest[undirected]):
+            graph.edgetype2count_dictionary["".join(sorted([node_list[a][0], node_list[b][0]]))] += 1
+        graph.__compute_type_offsets()
+        graph.edge_keys_ = None
+        return graph
+
+    def __compute_type_offsets(self):
+        """
+        We encode the nodetype using the first character of the node label. Since the node indices are
+        assigned to the lexicographically sorted node labels, the nodes of each type occupy a contiguous
+        range of indices, and every adjacency block in edge_to is ordered by (neighbor type, index).
+        This function records for each node the offset at which the neighbors of each type start within
+        its block, so that the neighbors of a given type can be retrieved as a slice of edge_to.
+        """
+        self.nodetypes = sorted(self.nodetype2count_dictionary.keys())
+        self.nodetype_to_index_map = {nodetype: i for i, nodetype in enumerate(self.nodetypes)}
+        type_count = len(self.nodetypes)
+        node_count = len(self.offset_to_edge_) - 1
+        # type_to_node_offset[k] is the index of the first node of the k-th type
+        counts = [self.nodetype2count_dictionary[nodetype] for nodetype in self.nodetypes]
+        self.type_to_node_offset = np.zeros(type_count + 1, dtype=np.int32)
+        self.type_to_node_offset[1:] = np.cumsum(counts)
+        # type (as an index into self.nodetypes) of the destination of each edge
+        dest_type = np.searchsorted(self.type_to_node_offset, self.edge_to, side='right') - 1
+        source = np.repeat(np.arange(node_count), np.diff(self.offset_to_edge_))
+        type_counts = np.bincount(source * type_count + dest_type,
+                                  minlength=node_count * type_count).reshape(node_count, type_count)
+        # type_offset_to_edge_[i, k]:type_offset_to_edge_[i, k+1] is the range of edge_to that holds
+        # the neighbors of node i that have the k-th type
+        self.type_offset_to_edge_ = np.zeros((node_count, type_count + 1), dtype=np.int32)
+        self.type_offset_to_edge_[:, 0] = self.offset_to_edge_[:-1]
+        self.type_offset_to_edge_[:, 1:] = self.offset_to_edge_[:-1, np.newaxis] + np.cumsum(type_counts, axis=1)
 
     def nodes(self):
         return list(self.node_to_index_map.keys())
@@ -143,6 +230,47 @@ class CSFGraph:
             nbrs.append(nbr)
         return nbrs
 
+    def neighbor_index_range(self, source_idx, nodetype):
+        """
+        :param source_idx: index (integer) of source node
+        :param nodetype: node type, i.e., the first character of the node label, e.g., 'g'
+        :return: (start, end) such that edge_to[start:end] holds the indices of the neighbors of
+        the source node that have the given type. The range is empty if there are no such neighbors.
+        """
+        k = self.nodetype_to_index_map.get(nodetype)
+        if k is None:
+            start = self.offset_to_edge_[source_idx]
+            return start, start
+        return self.type_offset_to_edge_[source_idx, k], self.type_offset_to_edge_[source_idx, k + 1]
+
+    def neighbor_type_counts(self, source_idx):
+        """
+        :param source_idx: index (integer) of source node
+        :return: numpy array with the number of neighbors of the source node of each type, in the
+        order of self.nodetypes
+        """
+        return np.diff(self.type_offset_to_edge_[source_idx])
+
+    def neighbors_of_type(self, source, nodetype):
+        """
+        :param source: label of source node
+        :param nodetype: node type, i.e., the first character of the node label, e.g., 'g'
+        :return: list of labels of the neighbors of the source that have the given type
+        """
+        source_idx = self.node_to_index_map[source]
+        start, end = self.neighbor_index_range(source_idx, nodetype)
+        return [self.index_to_node_map[i] for i in self.edge_to[start:end]]
+
+    def node_index_range(self, nodetype):
+        """
+        :param nodetype: node type, i.e., the first character of the node label, e.g., 'g'
+        :return: (start, end) such that the nodes with indices start, ..., end-1 have the given type
+        """
+        k = self.nodetype_to_index_map.get(nodetype)
+        if k is None:
+            return 0, 0
+        return self.type_to_node_offset[k], self.type_to_node_offset[k + 1]
+
     def has_edge(self, src, dest):
         """
         Check if the graph hhas an edge between src and dest
@@ -155,6 +283,162 @@ class CSFGraph:
                 return True
         return False
 
+    def edge_keys(self):
+        """
+        :return: sorted int64 array with the key source_idx * node_count + dest_idx of every edge. Since the
+        adjacency blocks are ordered by source and every block is ordered by destination, the keys are sorted
+        as they come, and membership of many pairs can be tested with one np.searchsorted (see has_edges)
+        """
+        if self.edge_keys_ is None:
+            node_count = np.int64(self.node_count())
+            source = np.repeat(np.arange(node_count, dtype=np.int64), np.diff(self.offset_to_edge_))
+            keys = source * node_count + self.edge_to
+            if np.any(keys[1:] < keys[:-1]):
+                keys.sort()
+            self.edge_keys_ = keys
+        return self.edge_keys_
+
+    def has_edges(self, source_idx, dest_idx):
+        """
+        Vectorized version of has_edge for node indices
+        :param source_idx: int array with indices of source nodes
+        :param dest_idx: int array with indices of destination nodes (same shape as source_idx)
+        :return: boolean array that is True where the graph has an edge between source_idx and dest_idx
+        """
+        query = np.asarray(source_idx, dtype=np.int64) * self.node_count() + np.asarray(dest_idx, dtype=np.int64)
+        return self.__has_keys(query)
+
+    def __has_keys(self, query):
+        """
+        :param query: int64 array with keys source_idx * node_count + dest_idx (see edge_keys). The search is much
+        faster if the query is sorted, because consecutive searches then touch the same parts of the keys
+        :return: boolean array that is True where the key is the key of an edge
+        """
+        keys = self.edge_keys()
+        if len(keys) == 0:
+            return np.zeros(query.shape, dtype=bool)
+        positions = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        return keys[positions] == query
+
+    def sample_negative_edges(self, count, source_type=None, dest_type=None, degree_matched=False, seed=None):
+        """
+        Sample pairs of nodes that are not connected by an edge (negative examples for link prediction). Candidate
+        pairs are drawn in large vectorized batches, and self loops, existing edges (see has_edges), and duplicates
+        are rejected until count pairs remain
+        :param count: number of negative edges
+        :param source_type: if not None, the node type of the sources, e.g., 'g' (see node_index_range)
+        :param dest_type: if not None, the node type of the destinations, e.g., 'd'
+        :param degree_matched: if True, nodes are drawn with a probability proportional to their degree (so that the
+        negative edges have the same degree distribution as the edges), otherwise uniformly
+        :param seed: seed of the random number generator, for reproducible samples
+        :return: int array of shape (count, 2) with the indices of the source and destination nodes. Each undirected
+        pair occurs at most once
+        """
+        rng = np.random.default_rng(seed)
+        node_count = self.node_count()
+        source_range = self.node_index_range(source_type) if source_type is not None else (0, node_count)
+        dest_range = self.node_index_range(dest_type) if dest_type is not None else (0, node_count)
+        if source_range[0] == source_range[1] or dest_range[0] == dest_range[1]:
+            raise TypeError("no nodes of type {} or {}".format(source_type, dest_type))
+        # if the ranges of the sources and destinations overlap, (a, b) and (b, a) can both be drawn, and they are the
+        # same undirected pair. With the same range, the pairs are simply ordered. Otherwise the pairs keep their
+        # orientation (so that the sources and destinations have their types), and are deduplicated by the key of
+        # the ordered pair
+        symmetric = max(source_range[0], dest_range[0]) < min(source_range[1], dest_range[1])
+        ordered = source_range == dest_range
+        degrees = np.diff(self.offset_to_edge_)
+
+        def draw(node_range, size):
+            start, end = node_range
+            if not degree_matched:
+                return rng.integers(start, end, size, dtype=np.int64)
+            cumulative = np.cumsum(degrees[start:end], dtype=np.int64)
+            if cumulative[-1] == 0:
+                raise TypeError("degree-matched sampling requires nodes with edges")
+            return start + np.searchsorted(cumulative, rng.integers(0, cumulative[-1], size), side='right')
+
+        keys = np.empty(0, dtype=np.int64)  # keys of the sampled pairs, source_idx * node_count + dest_idx
+        undirected_keys = np.empty(0, dtype=np.int64)  # keys of the ordered sampled pairs (sorted)
+        failures = 0
+        while len(keys) < count:
+            # a few more candidates than needed, since some are rejected
+            size = (count - len(keys)) * 11 // 10 + 1024
+            source, dest = draw(source_range, size), draw(dest_range, size)
+            if ordered:
+                source, dest = np.minimum(source, dest), np.maximum(source, dest)
+            valid = source != dest
+            source, dest = source[valid], dest[valid]
+            # np.unique sorts the candidates, which removes the duplicates and speeds up the membership test
+            if symmetric and not ordered:
+                undirected, first = np.unique(np.minimum(source, dest) * node_count + np.maximum(source, dest),
+                                              return_index=True)
+                candidates = source[first] * node_count + dest[first]
+            else:
+                undirected = candidates = np.unique(source * node_count + dest)
+            # the edges are stored in both directions, and so the ordered key is an edge key if the pair is an edge
+            fresh = ~self.__has_keys(undirected)
+            if len(keys) > 0:
+                fresh &= ~np.isin(undirected, undirected_keys, assume_unique=True)
+            if not np.any(fresh):
+                failures += 1
+                if failures == 10:
+                    raise TypeError("could only sample {} of {} negative edges".format(len(keys), count))
+            keys = np.concatenate([keys, candidates[fresh]])
+            undirected_keys = np.union1d(undirected_keys, undirected[fresh])
+        # choose count of the keys at random and in random order
+        keys = keys[rng.permutation(len(keys))[:count]]
+        return np.stack(np.divmod(keys, node_count), axis=1)
+
+    def split_edges(self, fraction, edge_type=None, seed=None):
+        """
+        Hold out a random fraction of the edges as test edges while keeping the training graph connected: the edges
+        of a random spanning forest (a minimum spanning tree for random weights) always remain in the training
+        graph, which therefore has the same connected components as this graph. The two graphs are built from
+        slices of the edge arrays (see from_edge_arrays)
+        :param fraction: fraction of the edges (of the given type, and not counting self-loops) that are held out
+        :param edge_type: if not None, only edges of this type are held out, e.g., 'dg' for the edges between
+        diseases and genes (the sorted first characters of the node labels, see Edge.get_edge_type_string)
+        :param seed: seed of the random number generator, for reproducible splits
+        :return: the training graph and the test graph
+        """
+        if not 0 <= fraction < 1:
+            raise TypeError("fraction must be at least 0 and less than 1")
+        rng = np.random.default_rng(seed)
+        node_count = self.node_count()
+        source = np.repeat(np.arange(node_count, dtype=np.int64), np.diff(self.offset_to_edge_))
+        # each undirected edge once
+        undirected = source <= self.edge_to
+        source, dest = source[undirected], self.edge_to[undirected].astype(np.int64)
+        weights = self.edge_weight[undirected]
+        forest = minimum_spanning_tree(coo_matrix((1.0 + rng.random(len(source)), (source, dest)),
+                                                  shape=(node_count, node_count)).tocsr()).tocoo()
+        forest_keys = np.minimum(forest.row, forest.col).astype(np.int64) * node_count + np.maximum(forest.row,
+                                                                                                    forest.col)
+        in_forest = np.isin(source * node_count + dest, forest_keys)
+        if edge_type is None:
+            of_type = np.ones(len(source), dtype=bool)
+        else:
+            if len(edge_type) != 2:
+                raise TypeError("edge_type must consist of two node types, e.g., 'dg'")
+            node_types = np.array([self.index_to_node_map[i][0] for i in range(node_count)])
+            type_a, type_b = sorted(edge_type)
+            of_type = (((node_types[source] == type_a) & (node_types[dest] == type_b))
+                       | ((node_types[source] == type_b) & (node_types[dest] == type_a)))
+        # self-loops are not links between two nodes to be predicted, and they always remain in the training graph
+        of_type &= source != dest
+        test_count = int(round(fraction * np.count_nonzero(of_type)))
+        candidates = np.flatnonzero(of_type & ~in_forest)
+        if test_count > len(candidates):
+            log.warning("Only {} of {} edges can be held out without disconnecting the graph".format(
+                len(candidates), test_count))
+            test_count = len(candidates)
+        test = np.zeros(len(source), dtype=bool)
+        test[rng.choice(candidates, test_count, replace=False)] = True
+        labels = [self.index_to_node_map[i] for i in range(node_count)]
+        training_graph = CSFGraph.from_edge_arrays(labels, source[~test], dest[~test], weights[~test])
+        test_graph = CSFGraph.from_edge_arrays(labels, source[test], dest[test], weights[test])
+        return training_graph, test_graph
+
     def same_nodetype(self, n1, n2):
         """
         We encode the nodetype using the first character of the node label. For instance, g1 and g2
@@ -0,0 +1,200 @@
+import io
+import os
+
+import numpy as np
+
+# text: one line per node with the label and the values, separated by tabs (the original format of xn2v)
+# npy: the matrix as a .npy file, and the labels (one per line, in the order of the rows) in a .labels file
+# word2vec: the binary format of the original word2vec (and of gensim's KeyedVectors.load_word2vec_format)
+EMBEDDING_FORMATS = ('text', 'npy', 'word2vec')
+
+
+def embedding_format(path, file_format=None):
+    """
+    :param path: path of an embedding file
+    :param file_format: one of EMBEDDING_FORMATS, or None to infer it from the extension of path (.npy for npy,
+    .bin for word2vec, and text otherwise)
+    :return: the format of the embedding file
+    """
+    if file_format is None:
+        extension = os.path.splitext(path)[1].lower()
+        file_format = {'.npy': 'npy', '.bin': 'word2vec'}.get(extension, 'text')
+    if file_format not in EMBEDDING_FORMATS:
+        raise TypeError("file_format must be one of {} (got {})".format(", ".join(EMBEDDING_FORMATS), file_format))
+    return file_format
+
+
+def labels_path(path):
+    """
+    :param path: path of the .npy matrix of the npy format
+    :return: path of the file with the labels of the rows
+    """
+    return os.path.splitext(path)[0] + '.labels'
+
+
+def save_embeddings(path, labels, matrix, file_format=None):
+    """
+    Write the embeddings of the nodes (words) to a file
+    :param path: output path
+    :param labels: list of the labels (node names) of the rows of matrix
+    :param matrix: 2D array with one embedding per row
+    :param file_format: one of EMBEDDING_FORMATS (None: inferred from the extension, see embedding_format)
+    """
+    file_format = embedding_format(path, file_format)
+    labels = [str(label) for label in labels]
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim != 2 or len(labels) != len(matrix):
+        raise TypeError("matrix must be a 2D array with one row per label")
+    if file_format == 'npy':
+        np.save(path, matrix)
+        with open(labels_path(path), 'w') as f:
+            f.write("".join(label + "\n" for label in labels))
+    elif file_format == 'word2vec':
+        with open(path, 'wb') as f:
+            f.write("{} {}\n".format(len(labels), matrix.shape[1]).encode('utf-8'))
+            for label, row in zip(labels, matrix):
+                f.write(label.encode('utf-8') + b" " + row.astype('<f4').tobytes() + b"\n")
+    else:
+        # %.9g is enough to write float32 values without loss
+        values = io.StringIO()
+        np.savetxt(values, matrix, fmt='%.9g', delimiter='\t')
+        rows = values.getvalue().splitlines()
+        with open(path, 'w') as f:
+            f.write("".join(label + "\t" + row + "\n" for label, row in zip(labels, rows)))
+
+
+def load_embeddings(path, file_format=None):
+    """
+    Read embeddings written by save_embeddings (or Word2Vec.write_embeddings)
+    :param path: path of the embedding file (the .npy file for the npy format)
+    :param file_format: one of EMBEDDING_FORMATS (None: inferred from the extension, see embedding_format)
+    :return: list of labels and a 2D float32 array with the embedding of the i'th label in the i'th row
+    """
+    file_format = embedding_format(path, file_format)
+    if file_format == 'npy':
+        matrix = np.load(path)
+        with open(labels_path(path)) as f:
+            labels = f.read().splitlines()
+    elif file_format == 'word2vec':
+        with open(path, 'rb') as f:
+            count, dimension = (int(x) for x in f.readline().split())
+            labels = []
+            matrix = np.empty((count, dimension), dtype=np.float32)
+            for i in range(count):
+                labels.append(_read_word(f))
+                matrix[i] = np.frombuffer(f.read(4 * dimension), dtype='<f4')
+    else:
+        with open(path) as f:
+            lines = f.read().splitlines()
+        labels, values = [], []
+        for line in lines:
+            label, _, row = line.partition('\t')
+            labels.append(label)
+            values.append(row)
+        # parse all values at once rather than float by float
+        matrix = np.fromstring("\t".join(values), dtype=np.float32, sep='\t').reshape(len(labels), -1)
+    if len(labels) != len(matrix):
+        raise TypeError("{} has {} labels but {} embeddings".format(path, len(labels), len(matrix)))
+    return labels, matrix
+
+
+def _read_word(f):
+    """
+    Read the label of the next row of a word2vec binary file (terminated by a space, and possibly preceded by the
+    newline that ends the previous row)
+    """
+    chars = []
+    while True:
+        c = f.read(1)
+        if c == b" " or c == b"":
+            return b"".join(chars).decode('utf-8')
+        if c != b"\n":
+            chars.append(c)
+
+
+class EmbeddingStore:
+    """
+    Read-only store of node embeddings with an index from labels to rows, for the downstream consumers of the
+    embeddings (link prediction, similarity queries). Embeddings in the npy format are memory-mapped rather than
+    read, so that several processes that evaluate the same embeddings share the pages of the file in the page cache;
+    the text and word2vec formats are read into one float32 matrix. For instance,
+
+        store = EmbeddingStore("embedding.npy")
+        vectors = store.get_rows(["g1", "g2"])
+    """
+
+    def __init__(self, path, file_format=None, mmap=True):
+        """
+        :param path: path of the embedding file (see save_embeddings)
+        :param file_format: one of EMBEDDING_FORMATS (None: inferred from the extension, see embedding_format)
+        :param mmap: if True, memory-map the matrix of the npy format (read-only)
+        """
+        self.path = path
+        file_format = embedding_format(path, file_format)
+        if file_format == 'npy':
+            self.matrix = np.load(path, mmap_mode='r' if mmap else None)
+            with open(labels_path(path)) as f:
+                self.labels = f.read().splitlines()
+            if len(self.labels) != len(self.matrix):
+                raise TypeError("{} has {} labels but {} embeddings".format(path, len(self.labels), len(self.matrix)))
+        else:
+            self.labels, self.matrix = load_embeddings(path, file_format)
+        self.index = {label: row for row, label in enumerate(self.labels)}
+
+    @classmethod
+    def from_arrays(cls, labels, matrix):
+        """
+        :param labels: list of the labels (node names) of the rows of matrix
+        :param matrix: 2D array with one embedding per row
+        :return: EmbeddingStore of embeddings that are already in memory
+        """
+        store = cls.__new__(cls)
+        store.path = None
+        store.labels = list(labels)
+        store.matrix = np.asarray(matrix, dtype=np.float32)
+        if store.matrix.ndim != 2 or len(store.labels) != len(store.matrix):
+            raise TypeError("matrix must be a 2D array with one row per label")
+        store.index = {label: row for row, label in enumerate(store.labels)}
+        return store
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, label):
+        return label in self.index
+
+    def __getitem__(self, label):
+        """
+        :return: the embedding of the node with the given label
+        """
+        return self.matrix[self.index[label]]
+
+    @property
+    def dimension(self):
+        return self.matrix.shape[1]
+
+    def rows(self, labels):
+        """
+        :param labels: iterable of node labels
+        :return: 1D int array with the rows of the labels in the matrix (KeyError for unknown labels)
+        """
+        index = self.index
+        return np.fromiter((index[label] for label in labels), dtype=np.int64)
+
+    def get_rows(self, labels):
+        """
+        :param labels: iterable of node labels
+        :return: 2D float32 array with the embeddings of the labels (one gather, also for a memory-mapped matrix)
+        """
+        return self.matrix[self.rows(labels)]
+
+    def similarity(self, labels, other_labels):
+        """
+        :param labels: node labels
+        :param other_labels: node labels, as many as labels
+        :return: 1D array with the cosine similarity of the embeddings of each pair (labels[i], other_labels[i])
+        """
+        a = self.get_rows(labels)
+        b = self.get_rows(other_labels)
+        norms = np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+        return np.einsum('ij,ij->i', a, b) / norms
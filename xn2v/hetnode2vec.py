@@ -4,10 +4,10 @@ import numpy as np
 import random
 import logging
 import os
-import time
-from collections import defaultdict
 from multiprocessing import Pool
 
+from .instrumentation import instrumented
+
 log = logging.getLogger("xn2v.log")
 
 handler = logging.handlers.WatchedFileHandler(
@@ -69,6 +69,7 @@ class N2vGraph:
 
         return walk
 
+    @instrumented('N2vGraph.simulate_walks', items=lambda self, walks: sum(len(w) for w in walks), unit='nodes')
     def simulate_walks(self, num_walks, walk_length):
         """
         Repeatedly simulate random walks from each node.
@@ -85,6 +86,56 @@ class N2vGraph:
 
         return walks
 
+    def metapath_walk(self, walk_length, start_node, metapath):
+        """
+        Simulate a random walk starting from start node that follows the node types of the metapath,
+        as in metapath2vec. For instance, with the metapath 'gpgdg' the walk goes from a gene to a protein,
+        back to a gene, then to a disease, then back to a gene, and repeats the pattern from there.
+        At each step, the next node is chosen uniformly from the neighbors of the current node that have
+        the required type. The walk stops early if the current node has no neighbor of the required type.
+        :param walk_length: maximum number of nodes in the walk
+        :param start_node: label of the first node of the walk, its type should be metapath[0]
+        :param metapath: sequence of node types, e.g., 'gpgdg' or ['g', 'p', 'g', 'd', 'g']
+        """
+        g = self.g
+        pattern = metapath[1:]
+        cur = g.node_to_index_map[start_node]
+        walk = [cur]
+        while len(walk) < walk_length:
+            nodetype = pattern[(len(walk) - 1) % len(pattern)]
+            # The neighbors of cur that have the required type are a contiguous slice of edge_to
+            start, end = g.neighbor_index_range(cur, nodetype)
+            if start == end:
+                break
+            cur = int(g.edge_to[np.random.randint(start, end)])
+            walk.append(cur)
+        return [g.index_to_node_map[i] for i in walk]
+
+    @instrumented('N2vGraph.simulate_metapath_walks', items=lambda self, walks: sum(len(w) for w in walks),
+                  unit='nodes')
+    def simulate_metapath_walks(self, num_walks, walk_length, metapath):
+        """
+        Repeatedly simulate metapath-guided random walks from each node whose type is the first type
+        of the metapath.
+        :param num_walks: number of walks to start from each node
+        :param walk_length: maximum number of nodes in each walk
+        :param metapath: sequence of node types that starts and ends with the same type, e.g., 'gpgdg'
+        """
+        if len(metapath) < 2 or metapath[0] != metapath[-1]:
+            raise TypeError("metapath must have at least two node types and start and end with the same type")
+        g = self.g
+        walks = []
+        start, end = g.node_index_range(metapath[0])
+        nodes = [g.index_to_node_map[i] for i in range(start, end)]
+        log.info('Metapath walk iteration:')
+        for walk_iter in range(num_walks):
+            print("{}/{}".format(walk_iter+1, num_walks))
+            random.shuffle(nodes)
+            for node in nodes:
+                walks.append(self.metapath_walk(walk_length=walk_length, start_node=node, metapath=metapath))
+
+        return walks
+
     def get_alias_edge(self, edge):
         """
         Get the alias edge setup lists for a given edge.
@@ -120,6 +171,7 @@ class N2vGraph:
 
 
 
+    @instrumented('N2vGraph.preprocess_transition_probs', items=lambda self, _: self.g.edge_count(), unit='edges')
     def __preprocess_transition_probs(self, num_processes=8):
         """
         Preprocessing of transition probabilities for guiding the random walks.
@@ -154,6 +206,31 @@ class N2vGraph:
 
         return
 
+    def get_neighbor_type_probs(self, node):
+        """
+        Calculate the probability of going from node to each of its neighbors according to the type of the
+        neighbor. The probability of switching to any other node type is gamma, split evenly between the
+        neighbors of that type, and the remaining probability is split evenly between the neighbors of the
+        same type as node. The neighbors of each type are a contiguous slice of the adjacency block of the node
+        (see CSFGraph), and so we obtain the counts per type without looking at the neighbor labels.
+        :param node: label of the node, e.g., g42
+        :return: numpy array with one probability per neighbor, in the order of g.neighbors(node)
+        """
+        g = self.g
+        node_idx = g.node_to_index_map[node]
+        # ASSUMPTION. The type of the node is encoded by its first character, e.g., g42 is a gene
+        owntype = g.nodetype_to_index_map[node[0]]
+        type_counts = g.neighbor_type_counts(node_idx)
+        type_probs = np.zeros(len(type_counts))
+        # owntype is going to a different node type
+        other_types = type_counts > 0
+        other_types[owntype] = False
+        type_probs[other_types] = float(self.gamma) / type_counts[other_types]
+        total_non_own_probability = np.sum(type_probs)
+        if type_counts[owntype] > 0:
+            type_probs[owntype] = (1 - total_non_own_probability) / float(type_counts[owntype])
+        return np.repeat(type_probs, type_counts)
+
     def get_alias_edge_xn2v(self, src, dst):
         """
         Get the alias edge setup lists for a given edge.
@@ -161,37 +238,14 @@ class N2vGraph:
         g = self.g
         p = self.p
         q = self.q
-        # log.info("source node:{}".format(src))
-        # log.info("destination node:{}".format(dst))
-        dsttype = dst[0]
-        dst2count = defaultdict(int)  # counts for going from current node ("dst") to nodes of a given type (g, p,d)
-        dst2prob = defaultdict(float)  # probs calculated from own2count
-        total_neighbors = 0
         # No need to explicitly sort, g returns a sorted list
         sorted_neighbors = g.neighbors(dst)
-        for nbr in sorted_neighbors:
-            nbrtype = nbr[0]
-            dst2count[nbrtype] += 1
-            total_neighbors += 1
-        total_non_own_probability = 0.0
-        for n, count in dst2count.items():
-            if n == dsttype:
-                # we need to count up the other types before we can calculate this!
-                continue
-            else:
-                # owntype is going to a different node type
-                dst2prob[n] = float(self.gamma) / float(count)
-                total_non_own_probability += dst2prob[n]
-        if dst2count[dsttype] == 0:
-            dst2prob[dsttype] = 0
-        else:
-            dst2prob[dsttype] = (1 - total_non_own_probability) / float(dst2count[dsttype])
+        type_probs = self.get_neighbor_type_probs(dst)
         # Now assign the final unnormalized probs
-        unnormalized_probs = np.zeros(total_neighbors)
+        unnormalized_probs = np.zeros(len(sorted_neighbors))
         i = 0
         for dst_nbr in sorted_neighbors:
-            nbrtype = dst_nbr[0]
-            prob = dst2prob[nbrtype]
+            prob = type_probs[i]
             edge_weight = g.weight(dst, dst_nbr)
             if dst_nbr == src:
                 unnormalized_probs[i] = prob * edge_weight / p
@@ -204,49 +258,21 @@ class N2vGraph:
         normalized_probs = [float(u_prob) / norm_const for u_prob in unnormalized_probs]
         return self.__alias_setup(normalized_probs)
 
+    @instrumented('N2vGraph.preprocess_transition_probs_xn2v', items=lambda self, _: self.g.edge_count(), unit='edges')
     def __preprocess_transition_probs_xn2v(self):
         """
         Preprocessing of transition probabilities for guiding the random walks.
         This version uses gamma to calculate weighted skipping across a heterogeneous network
         """
-        starttime = time.time()
         G = self.g
 
         alias_edges = {}
         alias_nodes = {}
         for node in G.nodes():
-            # ASSUMPTION. The type of the node is encoded by its first character, e.g., g42 is a gene
-            owntype = node[0]
-            own2count = defaultdict(int)  # counts for going from current node ("own") to nodes of a given type (g, p,d)
-            own2prob = defaultdict(float)  # probs calculated from own2count
-            total_neighbors = 0
-            # G returns a sorted list of neighbors of node
-            sorted_neighbors = G.neighbors(node)
-            for nbr in sorted_neighbors:
-                nbrtype = nbr[0]
-                own2count[nbrtype] += 1
-                total_neighbors += 1
-            total_non_own_probability = 0.0
-            for n, count in own2count.items():
-                if n == owntype:
-                    # we need to count up the other types before we can calculate this!
-                    continue
-                else:
-                    # owntype is going to a different node type
-                    own2prob[n] = float(self.gamma) / float(count)
-                    total_non_own_probability += own2prob[n]
-            if own2count[owntype] == 0:
-                own2prob[owntype] = 0
-            else:
-                own2prob[owntype] = (1 - total_non_own_probability) / float(own2count[owntype])
-            # Now assign the final unnormalized probs
-            unnormalized_probs = np.zeros(total_neighbors)
-            i = 0
-            for nbr in sorted_neighbors:
-                nbrtype = nbr[0]
-                prob = own2prob[nbrtype]
-                unnormalized_probs[i] = prob * G.weight(node, nbr)
-                i += 1
+            node_idx = G.node_to_index_map[node]
+            # The weights of the edges from node, in the order of G.neighbors(node)
+            weights = G.edge_weight[G.offset_to_edge_[node_idx]:G.offset_to_edge_[node_idx + 1]]
+            unnormalized_probs = self.get_neighbor_type_probs(node) * weights
             norm_const = sum(unnormalized_probs)
             # log.info("norm_const {}".format(norm_const))
             normalized_probs = [float(u_prob) / norm_const for u_prob in unnormalized_probs]
@@ -256,10 +282,6 @@ class N2vGraph:
 
         self.alias_edges = alias_edges
         self.alias_nodes = alias_nodes
-        endtime = time.time()
-        duration = endtime - starttime
-        log.info("Setup alias probabilities for graph in {:.2f} seconds.".format(duration))
-        print("Setup alias probabilities for graph in {:.2f} seconds.".format(duration))
 
     def retrieve_alias_nodes(self):
         return self.alias_nodes
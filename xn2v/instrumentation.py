@@ -0,0 +1,164 @@
+import collections
+import functools
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # resource is not available on Windows
+    resource = None
+
+log = logging.getLogger(__name__)
+
+# Default number of stages that an Instrumentation object keeps (the oldest stages are dropped first)
+MAX_STAGES = 1000
+
+
+def peak_rss_mb():
+    """
+    :return: peak resident set size of the current process in megabytes, or None if it cannot be determined
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on macOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        return peak / (1024.0 * 1024.0)
+    return peak / 1024.0
+
+
+class Instrumentation:
+    """
+    Record the wall time, peak memory, item count, and throughput of the stages of the pipeline
+    (loading the graph, preprocessing the transition probabilities, simulating the walks, training
+    the embeddings, link prediction, ...). The stages of the xn2v classes are recorded in the instance
+    returned by get_instrumentation(). For instance,
+
+        g = CSFGraph(path)
+        walks = N2vGraph(g, p, q, gamma).simulate_walks(num_walks, walk_length)
+        print(get_instrumentation().summary())
+        get_instrumentation().write_report("report.json")
+
+    Only the last max_stages stages are kept, so that a long-running process that calls instrumented methods
+    many times (e.g., link prediction in a loop) does not accumulate records without bound
+    """
+
+    def __init__(self, max_stages=MAX_STAGES, enabled=True):
+        """
+        :param max_stages: number of stages that are kept (None: keep all stages)
+        :param enabled: if False, stages are timed and logged but not recorded
+        """
+        if max_stages is not None and max_stages < 1:
+            raise TypeError("max_stages must be at least 1 (or None)")
+        self.max_stages = max_stages
+        self.enabled = enabled
+        self.stages = collections.deque(maxlen=max_stages)
+
+    @contextmanager
+    def stage(self, name, items=None, unit=None):
+        """
+        Context manager that records one stage. The number of items can be set (or updated) within the
+        context via the yielded dictionary, e.g., record['items'] = len(walks)
+        :param name: name of the stage, e.g., 'CSFGraph.load'
+        :param items: number of items (edges, walk steps, ...) processed in the stage
+        :param unit: what the items are, e.g., 'edges'
+        """
+        record = {'stage': name, 'items': items, 'unit': unit}
+        peak_before = peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            peak_after = peak_rss_mb()
+            record['seconds'] = seconds
+            record['peak_rss_mb'] = peak_after
+            record['peak_rss_increase_mb'] = None if peak_after is None else peak_after - peak_before
+            if record['items'] is not None and seconds > 0:
+                record['throughput'] = record['items'] / seconds
+            else:
+                record['throughput'] = None
+            if self.enabled:
+                self.stages.append(record)
+            log.debug(self.format_stage(record))
+
+    @staticmethod
+    def format_stage(record):
+        msg = "{}: {:.2f} seconds".format(record['stage'], record['seconds'])
+        if record['items'] is not None:
+            unit = record['unit'] if record['unit'] is not None else 'items'
+            msg += ", {} {}".format(record['items'], unit)
+            if record['throughput'] is not None:
+                msg += " ({:.1f} {}/sec)".format(record['throughput'], unit)
+        if record['peak_rss_mb'] is not None:
+            msg += ", peak RSS {:.1f} MB".format(record['peak_rss_mb'])
+        return msg
+
+    def reset(self):
+        self.stages.clear()
+
+    def report(self):
+        """
+        :return: dictionary with all recorded stages and totals, suitable for serialization as JSON
+        """
+        return {
+            'stages': list(self.stages),
+            'total_seconds': sum(record['seconds'] for record in self.stages),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+    def summary(self):
+        """
+        :return: a human readable string with one line per recorded stage
+        """
+        return "\n".join(self.format_stage(record) for record in self.stages)
+
+    def write_report(self, path):
+        """
+        Write the report (see report()) as JSON to path
+        """
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+_instrumentation = Instrumentation()
+
+
+def get_instrumentation():
+    """
+    :return: the Instrumentation object in which the xn2v classes record their stages
+    """
+    return _instrumentation
+
+
+def set_instrumentation(instrumentation):
+    """
+    Replace the Instrumentation object in which the xn2v classes record their stages, e.g., to collect
+    the stages of separate runs in separate reports
+    """
+    global _instrumentation
+    if not isinstance(instrumentation, Instrumentation):
+        raise TypeError("instrumentation must be an Instrumentation object")
+    _instrumentation = instrumentation
+
+
+def instrumented(name, items=None, unit=None):
+    """
+    Decorator that records each call of a method as a stage of the current Instrumentation object
+    :param name: name of the stage
+    :param items: optional function (self, result) -> number of items processed by the call
+    :param unit: what the items are, e.g., 'edges'
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with get_instrumentation().stage(name, unit=unit) as record:
+                result = func(self, *args, **kwargs)
+                if items is not None:
+                    record['items'] = items(self, result)
+            return result
+        return wrapper
+    return decorator
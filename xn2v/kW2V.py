@@ -9,6 +9,10 @@ import numpy as np
 import tensorflow as tf
 import collections
 
+from .corpus import SkipGramBatcherListOfLists
+from .corpus import token_counts
+from .corpus import tokens_to_array
+
 class NCE(tf.keras.layers.Layer):
     '''
     Custom Noise-Contrastive Estimation Loss
@@ -74,7 +78,9 @@ class kWord2Vec:
                  skip_window=3,
                  num_skips=2,
                  num_sampled=7,  # default=64
-                 display=None
+                 display=None,
+                 subsample_threshold=None,
+                 seed=None
                  ):
         """
         :param learning_rate:
@@ -86,6 +92,10 @@ class kWord2Vec:
         :param skip_window: # How many words to consider left and right.
         :param num_skips: # How many times to reuse an input to generate a label.
         :param num_sampled: # Number of negative examples to sample.
+        :param subsample_threshold: if not None, frequent words of a list of lists (e.g., random walks) are
+        subsampled with this threshold (see corpus.keep_probabilities), anew for every block of walks, so that
+        each pass through the walks drops different tokens
+        :param seed: seed of the batches of a list of lists (choice of context words and subsampling)
         """
         self.learning_rate = learning_rate
         self.batch_size = batch_size
@@ -112,22 +122,21 @@ class kWord2Vec:
             raise TypeError("data must be a list")
         if len(data) == 0:
             raise TypeError("data cannot be an empty list")
-        first_elem = data[0]
-        if isinstance(first_elem, list):
-            self.list_of_lists = True
-            if len(first_elem) < 0:
-                raise TypeError("first list of data cannot be an empty list")
-            flat_list = [item for sublist in data for item in sublist]
-            self.vocabulary_size = min(self.max_vocabulary_size, len(set(flat_list)))
-            first_elem = first_elem[0]
-        else:
-            self.list_of_lists = False
-            self.vocabulary_size = min(self.max_vocabulary_size, len(set(data)))
+        # one pass over the int32 tokens checks that they are integers and counts the distinct tokens
+        tokens = tokens_to_array(data)
+        self.list_of_lists = tokens.ndim == 2
+        self.vocabulary_size = min(self.max_vocabulary_size, int(np.count_nonzero(token_counts(tokens))))
+        if not self.list_of_lists:
             print("Vocabulary size (flat) is %d" % self.vocabulary_size)
-        # when we get here, first elem must be a scalar integer of either the entire list or the first sublist
-        if not isinstance(first_elem, int):
-            raise TypeError("list elements must be integers")
         print("Vocabulary size: %d. listy of lists= %s" % (self.vocabulary_size, self.list_of_lists))
+        if self.list_of_lists:
+            # The fixed-size batches of a list of lists (subsampled, if subsample_threshold is not None) come from
+            # the same batcher as those of SkipGramWord2Vec
+            self.batcher = SkipGramBatcherListOfLists(tokens, batch_size=self.batch_size, skip_window=skip_window,
+                                                      num_skips=num_skips, subsample_threshold=subsample_threshold,
+                                                      seed=seed)
+        self.data = data
+        self.num_sentences = len(data)
         self.max_vocabulary_size = min(50000, self.vocabulary_size)
 
 
@@ -214,34 +223,20 @@ class kWord2Vec:
         :param num_skips: The number of data points to extract for each center node
         :param skip_window: The size of the surrounding window (For instance, if skip_window=2 and num_skips=1,
         we look at 5 nodes at a time, and choose one data point from the 4 nodes that surround the center node
-        :return: A batch of data points ready for learning
+        :return: A batch of data points ready for learning: all pairs of the next walk_count walks (subsampled, if
+        subsample_threshold is not None), see SkipGramBatcherListOfLists.generate_pairs
         """
-        # assert batch_size % num_skips == 0
-        assert num_skips <= 2 * skip_window
-        # self.data is a list of lists, e.g., [[1, 2, 3], [5, 6, 7]]
-        span = 2 * skip_window + 1
-        batch = np.ndarray(shape=0, dtype=np.int32)
-        labels = np.ndarray(shape=(0, 1), dtype=np.int32)
-        for _ in range(walk_count):
-            # here, sentence can be one random walk
-            sentence = self.data[self.current_sentence]
-            self.current_sentence += 1
-            sentence_len = len(sentence)
-            batch_count = sentence_len - span + 1
-            current_batch, current_labels = self.next_batch(sentence, batch_count, num_skips, skip_window)
-            batch = np.append(batch, current_batch)
-            labels = np.append(labels, current_labels, axis=0)
-            if self.current_sentence == self.num_sentences:
-                self.current_sentence = 0
-        return batch, labels
+        if num_skips != self.batcher.num_skips or skip_window != self.batcher.skip_window:
+            raise TypeError("num_skips and skip_window must be those of the model")
+        batch, labels = self.batcher.generate_pairs(walk_count)
+        return batch, labels.reshape(-1, 1)
 
     def train(self, display_step=2000):
         # Words for testing.
         # Run training for the given number of steps.
         for step in range(1, self.num_steps + 1):
             if self.list_of_lists:
-                walkcount = 2
-                batch_x, batch_y = self.next_batch_from_list_of_lists(walkcount, self.num_skips, self.skip_window)
+                batch_x, batch_y = self.batcher.generate_batch()
             else:
                 batch_x, batch_y = self.next_batch(self.data, self.batch_size, self.num_skips, self.skip_window)
             self.model.fit(batch_x, batch_y, epochs=1)
@@ -1,11 +1,21 @@
 import sys
+import time
+from multiprocessing import Pool
+from multiprocessing import shared_memory
 import numpy as np
+import pandas as pd
 from sklearn import metrics
+from sklearn.base import clone
 from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold
 from sklearn.metrics import roc_curve, roc_auc_score, average_precision_score
 import logging
 import os
 
+from .embeddings import EmbeddingStore
+from .instrumentation import instrumented
+from .neighbors import blocked_top_k
+
 
 handler = logging.handlers.WatchedFileHandler(os.environ.get("LOGFILE", "link_prediction.log"))
 formatter = logging.Formatter('%(asctime)s - %(levelname)s -%(filename)s:%(lineno)d - %(message)s')
@@ -14,49 +24,256 @@ log = logging.getLogger()
 log.setLevel(os.environ.get("LOGLEVEL", "DEBUG"))
 log.addHandler(handler)
 
+EDGE_EMBEDDING_METHODS = ('hadamard', 'average', 'weightedL1', 'weightedL2')
+# Number of edges whose embeddings are computed at once (the temporary arrays have chunk_size rows)
+EDGE_CHUNK_SIZE = 65536
+# Number of sources that are scored against all targets at once by top_k_bilinear
+BILINEAR_TILE_SIZE = 256
+
+
+def unique_edges(src, dst, node_count):
+    """
+    :param src: 1D int array with the source node of each edge
+    :param dst: 1D int array with the destination node of each edge
+    :param node_count: number of nodes (larger than all node indices)
+    :return: 2D int array with one (smaller index, larger index) row per undirected edge, i.e., without the inverse
+    edges of a symmetric edge list and without duplicates
+    """
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    keys = np.unique(np.minimum(src, dst) * node_count + np.maximum(src, dst))
+    return np.stack(np.divmod(keys, node_count), axis=1)
+
+
+def read_edge_file(path, index):
+    """
+    Read an edge file (one edge "nodeA nodeB [weight]" per line, as for CSFGraph) directly into the rows of the
+    nodes in the embedding, without building a CSFGraph and expanding it back into tuples of labels
+    :param path: path of the edge file
+    :param index: dictionary with key:node label, value:row of the embedding (e.g., EmbeddingStore.index)
+    :return: 2D int array with one (smaller row, larger row) pair per undirected edge (see unique_edges)
+    """
+    if not os.path.exists(path):
+        raise TypeError("Could not find edge file {}".format(path))
+    src, dst = [], []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 2:
+                continue
+            src.append(index[fields[0]])
+            dst.append(index[fields[1]])
+    return unique_edges(src, dst, len(index))
+
+
+def combine_embeddings(emb1, emb2, method, out):
+    """
+    Combine the embeddings of the two nodes of each edge into the edge embedding (one NumPy expression)
+    :param emb1: 2D array with the embeddings of the source nodes
+    :param emb2: 2D array with the embeddings of the destination nodes
+    :param method: "hadamard" (elementwise product), "average", "weightedL1" (absolute difference), or "weightedL2"
+    (squared difference)
+    :param out: 2D array of the same shape for the edge embeddings
+    """
+    if method == "hadamard":
+        np.multiply(emb1, emb2, out=out)
+    elif method == "average":
+        np.add(emb1, emb2, out=out)
+        out *= 0.5
+    elif method == "weightedL1":
+        np.subtract(emb1, emb2, out=out)
+        np.abs(out, out=out)
+    elif method == "weightedL2":
+        np.subtract(emb1, emb2, out=out)
+        np.square(out, out=out)
+    else:
+        raise TypeError("method must be one of {} (got {})".format(", ".join(EDGE_EMBEDDING_METHODS), method))
+
+
+def edge_embeddings(matrix, src, dst, method, chunk_size=EDGE_CHUNK_SIZE):
+    """
+    Embed edges by combining the embeddings of their nodes with one NumPy expression per chunk of edges
+    :param matrix: 2D array with one node embedding per row (may be memory-mapped)
+    :param src: 1D int array with the row of the source node of each edge
+    :param dst: 1D int array with the row of the destination node of each edge
+    :param method: edge embedding method (see combine_embeddings)
+    :param chunk_size: maximum number of edges that are embedded at once
+    :return: 2D float32 array with one edge embedding per row
+    """
+    if method not in EDGE_EMBEDDING_METHODS:
+        raise TypeError("method must be one of {} (got {})".format(", ".join(EDGE_EMBEDDING_METHODS), method))
+    if chunk_size < 1:
+        raise TypeError("chunk_size must be at least 1")
+    result = np.empty((len(src), matrix.shape[1]), dtype=np.float32)
+    for start in range(0, len(src), chunk_size):
+        combine_embeddings(matrix[src[start:start + chunk_size]], matrix[dst[start:start + chunk_size]], method,
+                           result[start:start + chunk_size])
+    return result
+
+
+def top_k_candidates(matrix, source_rows, target_rows, score, method, k=10, chunk_size=EDGE_CHUNK_SIZE):
+    """
+    Score all candidate edges between sources and targets (e.g., every gene against every disease) and keep only
+    the running top-k sources of each target. The candidates are enumerated target by target and embedded and
+    scored in blocks of chunk_size edges, so that the memory does not depend on the number of candidates
+    :param matrix: 2D array with one node embedding per row (may be memory-mapped)
+    :param source_rows: 1D int array with the rows of the source nodes
+    :param target_rows: 1D int array with the rows of the target nodes
+    :param score: function that maps a 2D block of edge embeddings to a 1D array of scores, e.g.,
+    lambda x: classifier.predict_proba(x)[:, 1]
+    :param method: edge embedding method (see edge_embeddings)
+    :param k: number of sources to keep per target
+    :param chunk_size: number of candidate edges per block
+    :return: two arrays of shape (len(target_rows), k): the indices (into source_rows) of the k best sources of
+    each target, best first, and their scores. With fewer than k sources, the rows are padded with -1 and -inf
+    """
+    if k < 1:
+        raise TypeError("k must be at least 1")
+    source_rows = np.asarray(source_rows)
+    target_rows = np.asarray(target_rows)
+    source_count = len(source_rows)
+    best_scores = np.full((len(target_rows), k), -np.inf)
+    best_sources = np.full((len(target_rows), k), -1, dtype=np.int64)
+    for start in range(0, source_count * len(target_rows), chunk_size):
+        candidates = np.arange(start, min(start + chunk_size, source_count * len(target_rows)))
+        targets, sources = np.divmod(candidates, source_count)
+        block = edge_embeddings(matrix, source_rows[sources], target_rows[targets], method, chunk_size)
+        scores = score(block)
+        # the candidates of a block are sorted by target, and each target merges its segment into its top-k
+        first, last = targets[0], targets[-1]
+        bounds = np.searchsorted(targets, np.arange(first, last + 2))
+        for target, lo, hi in zip(range(first, last + 1), bounds[:-1], bounds[1:]):
+            merged_scores = np.concatenate([best_scores[target], scores[lo:hi]])
+            merged_sources = np.concatenate([best_sources[target], sources[lo:hi]])
+            top = np.argpartition(-merged_scores, k - 1)[:k]
+            best_scores[target] = merged_scores[top]
+            best_sources[target] = merged_sources[top]
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    return np.take_along_axis(best_sources, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def top_k_bilinear(source_matrix, target_matrix, weights, bias=0.0, k=10, tile_size=BILINEAR_TILE_SIZE):
+    """
+    Score all pairs (source, target) with the bilinear form sum_i w_i * e_source,i * e_target,i + b, which is the
+    decision function of a linear classifier on Hadamard edge embeddings, and keep the top-k sources of each target.
+    The scores of a tile of sources against all targets are one matrix product (source_tile * w) @ target_matrix.T,
+    so that no edge embeddings are built at all
+    :param source_matrix: 2D array with the embeddings of the sources (one per row)
+    :param target_matrix: 2D array with the embeddings of the targets (one per row)
+    :param weights: 1D array with the weights w of the classifier (one per dimension)
+    :param bias: the intercept b of the classifier
+    :param k: number of sources to keep per target
+    :param tile_size: number of sources that are scored at once (a tile has tile_size * len(target_matrix) scores)
+    :return: two arrays of shape (len(target_matrix), k): the indices of the k best sources of each target, best
+    first, and their scores. With fewer than k sources, the rows are padded with -1 and -inf
+    """
+    # the targets are the queries and the sources the database of blocked_top_k
+    return blocked_top_k(target_matrix, source_matrix, k, tile_size, weights, bias)
+
+
+# State of a worker process of LinkPrediction.evaluate_grid: the gathered node embeddings of the edges (in shared
+# memory), the edge labels, and the edge embeddings of the last method
+_grid_state = {}
+
+
+def _init_grid_worker(shm_name, shape, labels):
+    """
+    Initializer of the worker processes of evaluate_grid: attach to the shared memory with the gathered embeddings
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    gathered = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+    _set_grid_state(gathered[0], gathered[1], labels, shm)
+
+
+def _set_grid_state(emb1, emb2, labels, shm=None):
+    _grid_state.clear()
+    _grid_state.update({'emb1': emb1, 'emb2': emb2, 'labels': labels, 'shm': shm, 'method': None, 'features': None})
+
+
+def _evaluate_grid_task(task):
+    """
+    Fit one classifier on the training edges of one fold and evaluate it on the test edges of the fold
+    :param task: (method, classifier name, classifier, fold, train indices, test indices). The fold is None for the
+    fixed test split
+    :return: dictionary with the metrics
+    """
+    method, name, classifier, fold, train, test = task
+    # the tasks are ordered by method, and so the edge embeddings are computed once per method and process
+    if _grid_state['method'] != method:
+        features = np.empty_like(_grid_state['emb1'])
+        combine_embeddings(_grid_state['emb1'], _grid_state['emb2'], method, features)
+        _grid_state['method'], _grid_state['features'] = method, features
+    features, labels = _grid_state['features'], _grid_state['labels']
+    classifier = clone(classifier)
+    start = time.perf_counter()
+    classifier.fit(features[train], labels[train])
+    fit_seconds = time.perf_counter() - start
+    predictions = classifier.predict_proba(features[test])[:, 1]
+    return {'method': method, 'classifier': name, 'fold': fold,
+            'roc_auc': roc_auc_score(labels[test], predictions),
+            'average_precision': average_precision_score(labels[test], predictions),
+            'accuracy': metrics.accuracy_score(labels[test], predictions >= 0.5),
+            'fit_seconds': fit_seconds}
+
+
 class LinkPrediction:
     def __init__(self, pos_train_graph, pos_test_graph, neg_train_graph, neg_test_graph,
                  embedded_train_graph_path, edge_embedding_method):
         """
         Set up for predicting links from results of node2vec analysis
-        :param pos_train_graph: The training graph
-        :param pos_test_graph:  Graph of links that we want to predict
-        :param neg_train_graph: Graph of non-existence links in training graph
-        :param neg_test_graph: Graph of non-existence links that we want to predict as negative edges
+        The four edge sets can be given as paths of edge files, which are read directly into arrays of embedding
+        rows (see read_edge_file), or as CSFGraph objects
+        :param pos_train_graph: The training graph (or path of its edge file)
+        :param pos_test_graph:  Graph of links that we want to predict (or path of its edge file)
+        :param neg_train_graph: Graph of non-existence links in training graph (or path of its edge file)
+        :param neg_test_graph: Graph of non-existence links that we want to predict as negative edges (or path)
         :param embedded_train_graph_path: The file produced by word2vec with the nodes embedded as vectors
         :param edge_embedding_method: The method to embed edges. It can be "hadamard", "average", "weightedL1" or "weightedL2"
         """
-        self.pos_train_edges = pos_train_graph.edges()
-        self.pos_test_edges = pos_test_graph.edges()
-        self.neg_train_edges = neg_train_graph.edges()
-        self.neg_test_edges = neg_test_graph.edges()
-        self.train_nodes = pos_train_graph.nodes()
-        self.test_nodes = pos_test_graph.nodes()
         self.embedded_train_graph = embedded_train_graph_path
         self.map_node_vector = {}
+        self.edge_classifier = None
+        self.grid_results = None
         self.read_embeddings()
         self.edge_embedding_method = edge_embedding_method
+        # each edge set is an array with one (source row, destination row) pair per undirected edge
+        self.pos_train_edges = self.read_edges(pos_train_graph)
+        self.pos_test_edges = self.read_edges(pos_test_graph)
+        self.neg_train_edges = self.read_edges(neg_train_graph)
+        self.neg_test_edges = self.read_edges(neg_test_graph)
+        labels = self.map_node_vector.labels
+        self.train_nodes = [labels[row] for row in np.unique(self.pos_train_edges)]
+        self.test_nodes = [labels[row] for row in np.unique(self.pos_test_edges)]
+
+    @instrumented('LinkPrediction.read_edges', items=lambda self, edges: len(edges), unit='edges')
+    def read_edges(self, graph):
+        """
+        :param graph: path of an edge file or a CSFGraph
+        :return: 2D int array with the rows (in the embedding) of the nodes of each undirected edge
+        """
+        if isinstance(graph, str):
+            return read_edge_file(graph, self.map_node_vector.index)
+        edges = graph.edges()
+        src = self.map_node_vector.rows(edge[0] for edge in edges)
+        dst = self.map_node_vector.rows(edge[1] for edge in edges)
+        return unique_edges(src, dst, len(self.map_node_vector))
 
+    @instrumented('LinkPrediction.read_embeddings', items=lambda self, _: len(self.map_node_vector), unit='embeddings')
     def read_embeddings(self):
         """
         reading the embeddings generated by the training graph
         :return:
         """
-        n_lines = 0
-        map_node_vector = {}  # reading the embedded graph to a map, key:node, value:vector
-        with open(self.embedded_train_graph, 'r') as f:
-            #next(f)#skip the header which contains 2 integers; number of nodes and dimension
-            for line in f:
-                fields = line.split('\t') #the format of each line: node v_1 v_2 ... v_d where v_i's are elements of
-                # the array corresponding to the embedding of the node
-                embe_vec = [float(i) for i in fields[1:]]
-                map_node_vector.update({fields[0]: embe_vec})#map each node to its corresponding vector
-                n_lines += 1
-        f.close()
-        self.map_node_vector = map_node_vector
-        log.debug("Finished ingesting {} lines (vectors) from {}".format(n_lines, self.embedded_train_graph))
+        # the format (text, npy, or word2vec binary) is inferred from the extension, and .npy files are
+        # memory-mapped, see EmbeddingStore. The store maps each node to its vector like a dictionary
+        self.map_node_vector = EmbeddingStore(self.embedded_train_graph)
+        log.debug("Finished ingesting {} lines (vectors) from {}".format(len(self.map_node_vector),
+                                                                          self.embedded_train_graph))
 
 
+    @instrumented('LinkPrediction.predict_links',
+                  items=lambda self, _: len(self.pos_train_edges) + len(self.neg_train_edges) +
+                  len(self.pos_test_edges) + len(self.neg_test_edges), unit='edges')
     def predict_links(self):
         pos_train_edge_embs = self.transform(edge_list=self.pos_train_edges, node2vector_map=self.map_node_vector)
         neg_train_edge_embs = self.transform(edge_list=self.neg_train_edges, node2vector_map=self.map_node_vector)
@@ -82,6 +299,7 @@ class LinkPrediction:
         # Train logistic regression classifier on train-set edge embeddings
         edge_classifier = LogisticRegression()
         edge_classifier.fit(train_edge_embs, train_edge_labels)
+        self.edge_classifier = edge_classifier
 
         self.predictions = edge_classifier.predict(test_edge_embs)
         self.confusion_matrix = metrics.confusion_matrix(test_edge_labels, self.predictions)
@@ -93,6 +311,80 @@ class LinkPrediction:
         self.test_roc = roc_auc_score(test_edge_labels, test_preds)#get the auc score
         self.test_average_precision = average_precision_score(test_edge_labels, test_preds)
 
+    @instrumented('LinkPrediction.evaluate_grid')
+    def evaluate_grid(self, methods=EDGE_EMBEDDING_METHODS, classifiers=None, folds=5, num_processes=4, seed=None):
+        """
+        Evaluate all combinations of edge embedding methods and classifiers. Each combination is cross-validated
+        within the training edges (positive and negative), and then fitted on all training edges and evaluated on
+        the fixed test split (as in predict_links). The test edges are never in a fold, and the training edges,
+        which the node embeddings were trained on, are never evaluated. The node embeddings of the edges are
+        gathered once and shared with the worker processes through shared memory, and each (method, classifier,
+        fold) and each (method, classifier) on the test split is one task of the pool
+        :param methods: edge embedding methods (see EDGE_EMBEDDING_METHODS)
+        :param classifiers: dictionary with key:name, value:scikit-learn classifier with predict_proba (default:
+        logistic regression). The classifiers are cloned for every fold
+        :param folds: number of folds of the stratified cross-validation
+        :param num_processes: number of worker processes (1: evaluate in this process)
+        :param seed: seed of the assignment of the training edges to folds
+        :return: pandas DataFrame with one row per method and classifier, the mean and standard deviation of the
+        ROC AUC, average precision, and accuracy over the folds, and the same metrics on the test split (test_roc_auc,
+        test_average_precision, test_accuracy). The metrics of the individual tasks are stored in grid_results
+        (with fold None for the test split)
+        """
+        if classifiers is None:
+            classifiers = {'LogisticRegression': LogisticRegression()}
+        for method in methods:
+            if method not in EDGE_EMBEDDING_METHODS:
+                raise TypeError("methods must be in {} (got {})".format(", ".join(EDGE_EMBEDDING_METHODS), method))
+        if num_processes < 1:
+            raise TypeError("num_processes must be at least 1")
+        # the training edges come first, so that the indices of the folds are the indices of the training edges
+        edges = np.concatenate([self.pos_train_edges, self.neg_train_edges, self.pos_test_edges, self.neg_test_edges])
+        labels = np.concatenate([np.ones(len(self.pos_train_edges)), np.zeros(len(self.neg_train_edges)),
+                                 np.ones(len(self.pos_test_edges)), np.zeros(len(self.neg_test_edges))])
+        train_count = len(self.pos_train_edges) + len(self.neg_train_edges)
+        splits = list(StratifiedKFold(folds, shuffle=True, random_state=seed).split(edges[:train_count],
+                                                                                    labels[:train_count]))
+        splits.append((np.arange(train_count), np.arange(train_count, len(edges))))
+        tasks = [(method, name, classifier, fold if fold < folds else None, train, test) for method in methods
+                 for name, classifier in classifiers.items() for fold, (train, test) in enumerate(splits)]
+        matrix = self.map_node_vector.matrix
+        shape = (2, len(edges), matrix.shape[1])
+        if num_processes == 1:
+            _set_grid_state(matrix[edges[:, 0]], matrix[edges[:, 1]], labels)
+            try:
+                results = [_evaluate_grid_task(task) for task in tasks]
+            finally:
+                _grid_state.clear()
+        else:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 4))
+            gathered = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+            try:
+                np.take(matrix, edges[:, 0], axis=0, out=gathered[0])
+                np.take(matrix, edges[:, 1], axis=0, out=gathered[1])
+                with Pool(processes=num_processes, initializer=_init_grid_worker,
+                          initargs=(shm.name, shape, labels)) as pool:
+                    results = pool.map(_evaluate_grid_task, tasks, chunksize=max(1, len(tasks) // num_processes))
+            finally:
+                # the buffer of the shared memory cannot be released while an array refers to it
+                del gathered
+                shm.close()
+                shm.unlink()
+        self.grid_results = pd.DataFrame(results)
+        is_test = self.grid_results['fold'].isna()
+        table = self.grid_results[~is_test].groupby(['method', 'classifier'], sort=False).agg(
+            folds=('fold', 'count'),
+            roc_auc=('roc_auc', 'mean'), roc_auc_std=('roc_auc', 'std'),
+            average_precision=('average_precision', 'mean'), average_precision_std=('average_precision', 'std'),
+            accuracy=('accuracy', 'mean'), accuracy_std=('accuracy', 'std'),
+            fit_seconds=('fit_seconds', 'mean')).reset_index()
+        test = self.grid_results[is_test][['method', 'classifier', 'roc_auc', 'average_precision', 'accuracy']]
+        table = table.merge(test.rename(columns={'roc_auc': 'test_roc_auc',
+                                                 'average_precision': 'test_average_precision',
+                                                 'accuracy': 'test_accuracy'}), on=['method', 'classifier'])
+        log.debug("Grid evaluation of link prediction:\n{}".format(table.to_string()))
+        return table
+
     def output_Logistic_Reg_results(self):
         """
         The method prints some metrics of the performance of the logistic regression classifier. including accuracy, specificity and sensitivity
@@ -117,51 +409,75 @@ class LinkPrediction:
         log.debug("node2vec Test ROC score: {} ".format(str(self.test_roc)))
         log.debug("node2vec Test AP score: {} ".format(str(self.test_average_precision)))
 
-    def transform(self,edge_list, node2vector_map):
+    def transform(self, edge_list, node2vector_map, chunk_size=EDGE_CHUNK_SIZE):
         """
         This method finds embedding for edges of the graph. There are 4 ways to calculate edge embedding: Hadamard, Average, Weighted L1 and Weighted L2
-        :param edge_list:
-        :param node2vector_map: key:node, value: embedded vector
-        :param size_limit: Maximum number of edges that are embedded
-        :return: list of embedded edges
+        The edges are converted to two arrays with the rows of the nodes, and the edge embeddings are computed for
+        all edges at once (see edge_embeddings)
+        :param edge_list: 2D int array with the rows of the nodes of each edge (see read_edges), or list of edges
+        (pairs of node labels)
+        :param node2vector_map: EmbeddingStore (or dictionary with key:node, value: embedded vector)
+        :param chunk_size: maximum number of edges that are embedded at once, which bounds the temporary memory
+        :return: 2D array of embedded edges, one row per edge
         """
-        embs = []
-        edge_embedding_method = self.edge_embedding_method
-        for edge in edge_list:
-            node1 = edge[0]
-            node2 = edge[1]
-            emb1 = node2vector_map[node1]
-            emb2 = node2vector_map[node2]
-            if edge_embedding_method == "hadamard":
-                # Perform a Hadamard transform on the node embeddings.
-                # This is a dot product of the node embedding for the two nodes that
-                # belong to each edge
-                edge_emb = np.multiply(emb1, emb2)
-            elif edge_embedding_method == "average":
-                # Perform a Average transform on the node embeddings.
-                # This is a elementwise average of the node embedding for the two nodes that
-                # belong to each edge
-                edge_emb = np.add(emb1, emb2) / 2
-            elif edge_embedding_method == "weightedL1":
-                # Perform weightedL1 transform on the node embeddings.
-                # WeightedL1 calculates the absolute value of difference of each element of the two nodes that
-                # belong to each edge
-                edge_emb = abs(emb1 - emb2)
-            elif edge_embedding_method == "weightedL2":
-                # Perform weightedL2 transform on the node embeddings.
-                # WeightedL2 calculates the square of difference of each element of the two nodes that
-                # belong to each edge
-                edge_emb = np.power((emb1 - emb2), 2)
-            else:
-                log.error("You need to enter hadamard, average, weightedL1, weightedL2")
-                sys.exit(1)
-            embs.append(edge_emb)
-        embs = np.array(embs)
-        return embs
+        if self.edge_embedding_method not in EDGE_EMBEDDING_METHODS:
+            log.error("You need to enter hadamard, average, weightedL1, weightedL2")
+            sys.exit(1)
+        if not isinstance(node2vector_map, EmbeddingStore):
+            node2vector_map = EmbeddingStore.from_arrays(list(node2vector_map.keys()),
+                                                         np.array(list(node2vector_map.values())))
+        if isinstance(edge_list, np.ndarray):
+            # rows of the nodes in the embedding, see read_edges
+            src, dst = edge_list[:, 0], edge_list[:, 1]
+        else:
+            src = node2vector_map.rows(edge[0] for edge in edge_list)
+            dst = node2vector_map.rows(edge[1] for edge in edge_list)
+        return edge_embeddings(node2vector_map.matrix, src, dst, self.edge_embedding_method, chunk_size)
+
+    def prioritize(self, sources, targets, k=10, chunk_size=EDGE_CHUNK_SIZE):
+        """
+        Rank the sources of each target (e.g., the genes of each disease) with the classifier fitted by predict_links.
+        All candidate edges are scored block by block and only the top-k sources per target are kept (see
+        top_k_candidates), so that also hundreds of millions of candidates fit in memory. For Hadamard edge embeddings
+        with logistic regression, the candidates are scored with matrix products (see top_k_bilinear)
+        :param sources: labels of the source nodes (e.g., all genes)
+        :param targets: labels of the target nodes (e.g., all diseases)
+        :param k: number of sources to keep per target
+        :param chunk_size: number of candidate edges that are embedded and scored at once
+        :return: dictionary with key:target, value: list of the k (source, probability) pairs with the highest
+        probability of an edge, best first
+        """
+        if self.edge_classifier is None:
+            raise TypeError("prioritize requires the classifier of predict_links")
+        if self.edge_embedding_method not in EDGE_EMBEDDING_METHODS:
+            log.error("You need to enter hadamard, average, weightedL1, weightedL2")
+            sys.exit(1)
+        store = self.map_node_vector
+        sources = list(sources)
+        targets = list(targets)
+        if self.edge_embedding_method == "hadamard" and isinstance(self.edge_classifier, LogisticRegression):
+            # The decision function of logistic regression on Hadamard embeddings is a bilinear form of the node
+            # embeddings, and so the candidates are scored with blocked matrix products (see top_k_bilinear).
+            # The sigmoid does not change the ranking and is applied to the top-k scores only
+            best_sources, best_scores = top_k_bilinear(
+                store.get_rows(sources), store.get_rows(targets), self.edge_classifier.coef_[0],
+                self.edge_classifier.intercept_[0], k)
+            best_scores = 1.0 / (1.0 + np.exp(-best_scores.astype(np.float64)))
+        else:
+            best_sources, best_scores = top_k_candidates(
+                store.matrix, store.rows(sources), store.rows(targets),
+                lambda x: self.edge_classifier.predict_proba(x)[:, 1], self.edge_embedding_method, k, chunk_size)
+        ranking = {}
+        for target, rows, scores in zip(targets, best_sources, best_scores):
+            ranking[target] = [(sources[row], float(score)) for row, score in zip(rows, scores) if row >= 0]
+        return ranking
 
     def output_diagnostics_to_logfile(self):
-        LinkPrediction.log_edge_node_information(self.pos_train_edges, "true_training")
-        LinkPrediction.log_edge_node_information(self.pos_test_edges, "true_test")
+        labels = self.map_node_vector.labels
+        LinkPrediction.log_edge_node_information([(labels[a], labels[b]) for a, b in self.pos_train_edges],
+                                                 "true_training")
+        LinkPrediction.log_edge_node_information([(labels[a], labels[b]) for a, b in self.pos_test_edges],
+                                                 "true_test")
 
     @staticmethod
     def log_edge_node_information(edge_list, group):#TODO:modify it for the homogenous graph
@@ -0,0 +1,182 @@
+import numpy as np
+
+# Number of database rows that are scored against all queries at once by blocked_top_k
+NEIGHBOR_BLOCK_SIZE = 4096
+
+
+def blocked_top_k(queries, database, k=10, block_size=NEIGHBOR_BLOCK_SIZE, weights=None, bias=0.0):
+    """
+    Score all queries against all rows of the database with dot products (weighted with weights, plus bias) and
+    keep the k best rows of each query. The database is processed in blocks of rows, and each block is one matrix
+    product followed by a merge of its scores into the running top-k, so that the memory depends on the block size
+    rather than on the size of the database
+    :param queries: 2D array with one query vector per row
+    :param database: 2D array with one vector per row (may be memory-mapped)
+    :param k: number of rows to keep per query
+    :param block_size: number of database rows that are scored at once
+    :param weights: optional 1D array with one weight per dimension (the score is sum_i w_i * q_i * x_i + bias)
+    :param bias: constant added to all scores
+    :return: two arrays of shape (len(queries), k): the indices of the k best database rows of each query, best
+    first, and their scores. With fewer than k rows, the results are padded with -1 and -inf
+    """
+    if k < 1:
+        raise TypeError("k must be at least 1")
+    if block_size < 1:
+        raise TypeError("block_size must be at least 1")
+    queries = np.asarray(queries, dtype=np.float32)
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+    for start in range(0, len(database), block_size):
+        block = np.asarray(database[start:start + block_size], dtype=np.float32)
+        if weights is not None:
+            block = block * np.asarray(weights, dtype=np.float32)
+        # scores of all queries (rows) against the database rows of the block (columns)
+        scores = queries @ block.T
+        scores += bias
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        merged_rows = np.concatenate(
+            [best_rows, np.broadcast_to(np.arange(start, start + len(block)), scores.shape)], axis=1)
+        top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, top, axis=1)
+        best_rows = np.take_along_axis(merged_rows, top, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def normalize_rows(matrix):
+    """
+    :param matrix: 2D array
+    :return: float32 copy of matrix with unit rows (rows of zeros remain zero)
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class ExactIndex:
+    """
+    Exact cosine nearest neighbors of query vectors among the rows of an embedding matrix, computed with blocked
+    matrix products (see blocked_top_k). For instance, the genes that are closest to a disease:
+
+        genes = [label for label in store.labels if label.startswith('g')]
+        index = ExactIndex(store.get_rows(genes), labels=genes)
+        index.neighbors(store.get_rows(['d1']), k=10)
+    """
+
+    def __init__(self, matrix, labels=None, block_size=NEIGHBOR_BLOCK_SIZE):
+        """
+        :param matrix: 2D array with one embedding per row
+        :param labels: optional list with the label of each row, for neighbors()
+        :param block_size: number of rows that are scored at once
+        """
+        self.matrix = normalize_rows(matrix)
+        if self.matrix.ndim != 2:
+            raise TypeError("matrix must be a 2D array")
+        if labels is not None and len(labels) != len(self.matrix):
+            raise TypeError("labels must have one label per row of matrix")
+        self.labels = labels
+        self.block_size = block_size
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def query(self, vectors, k=10):
+        """
+        :param vectors: 2D array with one query vector per row (or a 1D array for one query)
+        :param k: number of neighbors per query
+        :return: two arrays of shape (number of queries, k): the rows of the k nearest neighbors of each query,
+        nearest first, and their cosine similarities (padded with -1 and -inf if there are fewer than k neighbors)
+        """
+        return blocked_top_k(normalize_rows(np.atleast_2d(vectors)), self.matrix, k, self.block_size)
+
+    def neighbors(self, vectors, k=10):
+        """
+        :param vectors: 2D array with one query vector per row (or a 1D array for one query)
+        :param k: number of neighbors per query
+        :return: one list per query with the (label, cosine similarity) pairs of the k nearest neighbors
+        """
+        if self.labels is None:
+            raise TypeError("neighbors requires the labels of the rows")
+        rows, similarities = self.query(vectors, k)
+        return [[(self.labels[row], float(similarity)) for row, similarity in zip(query_rows, query_similarities)
+                 if row >= 0] for query_rows, query_similarities in zip(rows, similarities)]
+
+
+class LSHIndex(ExactIndex):
+    """
+    Approximate cosine nearest neighbors with random-projection locality-sensitive hashing. Each of num_tables
+    hash tables assigns every row the signs of its projections onto num_bits random hyperplanes, and rows with a
+    small angle between them are likely to get the same code. A query looks up the rows with its own code (and,
+    with probe, the codes that differ in one bit) in every table, and the candidates are ranked by their exact
+    cosine similarity. The buckets are the runs of equal codes in the sorted codes of each table, so that a lookup
+    is a binary search
+    """
+
+    def __init__(self, matrix, labels=None, num_tables=8, num_bits=12, probe=True, seed=None):
+        """
+        :param matrix: 2D array with one embedding per row
+        :param labels: optional list with the label of each row, for neighbors()
+        :param num_tables: number of hash tables (more tables find more of the true neighbors)
+        :param num_bits: number of hyperplanes per table (more bits give smaller buckets, i.e., faster queries)
+        :param probe: if True, also look up the buckets whose code differs from the code of the query in one bit
+        :param seed: seed of the random hyperplanes
+        """
+        super(LSHIndex, self).__init__(matrix, labels)
+        if num_tables < 1 or not 1 <= num_bits <= 62:
+            raise TypeError("num_tables must be at least 1, and num_bits between 1 and 62")
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.probe = probe
+        rng = np.random.default_rng(seed)
+        self.hyperplanes = rng.standard_normal((num_tables, num_bits, self.matrix.shape[1])).astype(np.float32)
+        self.bit_values = np.int64(1) << np.arange(num_bits, dtype=np.int64)
+        self.orders = []
+        self.sorted_codes = []
+        for table in range(num_tables):
+            codes = self.codes(self.matrix, table)
+            order = np.argsort(codes, kind='stable')
+            self.orders.append(order)
+            self.sorted_codes.append(codes[order])
+
+    def codes(self, vectors, table):
+        """
+        :return: int64 array with the hash codes of the vectors in the given table
+        """
+        return (vectors @ self.hyperplanes[table].T > 0) @ self.bit_values
+
+    def candidates(self, vectors):
+        """
+        :param vectors: 2D array with one normalized query vector per row
+        :return: one array per query with the rows in the buckets of the query
+        """
+        candidates = [[] for _ in range(len(vectors))]
+        for table in range(self.num_tables):
+            codes = self.codes(vectors, table)[:, np.newaxis]
+            if self.probe:
+                codes = np.concatenate([codes, codes ^ self.bit_values], axis=1)
+            lo = np.searchsorted(self.sorted_codes[table], codes, side='left')
+            hi = np.searchsorted(self.sorted_codes[table], codes, side='right')
+            order = self.orders[table]
+            for i in range(len(vectors)):
+                candidates[i].extend(order[start:end] for start, end in zip(lo[i], hi[i]) if end > start)
+        return [np.unique(np.concatenate(c)) if c else np.empty(0, dtype=np.int64) for c in candidates]
+
+    def query(self, vectors, k=10):
+        """
+        :param vectors: 2D array with one query vector per row (or a 1D array for one query)
+        :param k: number of neighbors per query
+        :return: two arrays of shape (number of queries, k): the rows of the approximate k nearest neighbors of each
+        query, nearest first, and their cosine similarities (padded with -1 and -inf if the buckets of the query
+        have fewer than k rows)
+        """
+        vectors = normalize_rows(np.atleast_2d(vectors))
+        rows = np.full((len(vectors), k), -1, dtype=np.int64)
+        similarities = np.full((len(vectors), k), -np.inf, dtype=np.float32)
+        for i, candidates in enumerate(self.candidates(vectors)):
+            if len(candidates) == 0:
+                continue
+            best, scores = blocked_top_k(vectors[i:i + 1], self.matrix[candidates], k, self.block_size)
+            found = best[0] >= 0
+            rows[i, :np.count_nonzero(found)] = candidates[best[0][found]]
+            similarities[i, :np.count_nonzero(found)] = scores[0][found]
+        return rows, similarities
@@ -0,0 +1,149 @@
+import threading
+
+import numpy as np
+
+
+def scatter_add(matrix, indices, updates):
+    """
+    Add the rows of updates to the rows of matrix given by indices, adding up the updates of indices that occur
+    several times (like np.add.at, which is much slower for rows). The updates are summed per index by sorting
+    the indices and np.add.reduceat
+    :param matrix: 2D array that is updated in place
+    :param indices: 1D int array with one row index of matrix per row of updates
+    :param updates: 2D array with the same number of columns as matrix
+    """
+    order = np.argsort(indices, kind='stable')
+    sorted_indices = indices[order]
+    starts = np.flatnonzero(np.concatenate([[True], sorted_indices[1:] != sorted_indices[:-1]]))
+    matrix[sorted_indices[starts]] += np.add.reduceat(updates[order], starts, axis=0)
+
+
+class SkipGramNegativeSampling:
+    """
+    Skip-gram with negative sampling (SGNS) implemented with NumPy, i.e., without TensorFlow. This is the engine of
+    the 'numpy' backend of SkipGramWord2Vec. The model consists of two matrices, the embedding of the center words
+    and the weights of the context words, and every training step is a sparse SGD update of the rows that are
+    referenced in the batch (centers, contexts, and sampled negatives). Several threads can train on the same
+    matrices without locks (Hogwild), because the updates of different batches rarely touch the same rows and
+    NumPy releases the GIL in its kernels.
+    """
+
+    def __init__(self, vocabulary_size, embedding_size, learning_rate=0.1, num_sampled=7, unigram_table=None,
+                 seed=None):
+        """
+        :param vocabulary_size: number of words (nodes)
+        :param embedding_size: dimension of embedded vectors
+        :param learning_rate: learning rate of the SGD updates
+        :param num_sampled: number of negative examples per positive example
+        :param unigram_table: UnigramTable from which the negative examples are drawn (uniform if None)
+        :param seed: seed of the random number generator (initialization and negative sampling)
+        """
+        if num_sampled < 1:
+            raise TypeError("num_sampled must be at least 1")
+        self.vocabulary_size = vocabulary_size
+        self.embedding_size = embedding_size
+        self.learning_rate = learning_rate
+        self.num_sampled = num_sampled
+        self.unigram_table = unigram_table
+        self.rng = np.random.default_rng(seed)
+        # The same initialization as the original word2vec: small random embeddings and zero context weights
+        self.embedding = ((self.rng.random((vocabulary_size, embedding_size), dtype=np.float32) - 0.5)
+                          / embedding_size)
+        self.weights = np.zeros((vocabulary_size, embedding_size), dtype=np.float32)
+
+    def sample_negatives(self, count, rng):
+        """
+        :param count: number of positive examples
+        :param rng: numpy random Generator
+        :return: array of shape (count, num_sampled) with negative examples, drawn from the unigram table (or
+        uniformly from the vocabulary if there is no unigram table)
+        """
+        if self.unigram_table is not None:
+            return self.unigram_table.sample((count, self.num_sampled), rng)
+        return rng.integers(0, self.vocabulary_size, (count, self.num_sampled), dtype=np.int32)
+
+    def train_batch(self, centers, contexts, rng=None):
+        """
+        Apply one SGD step for a batch of (center, context) pairs
+        :param centers: 1D int array with the center words
+        :param contexts: int array with the context words, with shape (batch_size,) or (batch_size, 1)
+        :param rng: numpy random Generator for the negative samples (each thread needs its own Generator)
+        :return: average loss of the batch before the update
+        """
+        if rng is None:
+            rng = self.rng
+        contexts = np.reshape(contexts, -1)
+        # The first target of each example is the context word (label 1), followed by the negatives (label 0)
+        targets = np.concatenate([contexts[:, np.newaxis], self.sample_negatives(len(contexts), rng)], axis=1)
+        h = self.embedding[centers]  # (batch_size, dim)
+        u = self.weights[targets]  # (batch_size, 1 + num_sampled, dim)
+        scores = np.einsum('bd,bkd->bk', h, u)
+        probabilities = 1.0 / (1.0 + np.exp(-scores))
+        labels = np.zeros_like(probabilities)
+        labels[:, 0] = 1.0
+        # gradient ascent on the log likelihood, scaled with the learning rate
+        g = (labels - probabilities) * self.learning_rate
+        grad_h = np.einsum('bk,bkd->bd', g, u)
+        grad_u = g[:, :, np.newaxis] * h[:, np.newaxis, :]
+        scatter_add(self.weights, targets.ravel(), grad_u.reshape(-1, self.embedding_size))
+        scatter_add(self.embedding, centers, grad_h)
+        eps = 1e-7
+        loss = -np.log(probabilities[:, 0] + eps) - np.sum(np.log(1.0 - probabilities[:, 1:] + eps), axis=1)
+        return float(np.mean(loss))
+
+    def train(self, batches, num_threads=1, callback=None):
+        """
+        Train on all batches of an iterable. With num_threads > 1, the batches are distributed over threads that
+        update the matrices without locks (Hogwild)
+        :param batches: iterable of (centers, contexts) batches (each batch is copied when it is retrieved, so that the
+        iterable may reuse its buffers)
+        :param num_threads: number of training threads
+        :param callback: optional function (step, loss) that is called after every step, e.g., to show the loss
+        :return: number of steps
+        """
+        if num_threads < 1:
+            raise TypeError("num_threads must be at least 1")
+        iterator = iter(batches)
+        lock = threading.Lock()
+        state = {'step': 0, 'error': None}
+        seeds = self.rng.integers(0, 2 ** 31, num_threads)
+
+        def worker(seed):
+            rng = np.random.default_rng(seed)
+            while state['error'] is None:
+                with lock:
+                    # only the retrieval of the next batch is serialized, not the update. The batch is copied,
+                    # because the batches of a batcher are views of buffers that are reused by later batches
+                    batch = next(iterator, None)
+                    if batch is None:
+                        return
+                    centers, contexts = np.array(batch[0]), np.array(batch[1])
+                    state['step'] += 1
+                    step = state['step']
+                try:
+                    loss = self.train_batch(centers, contexts, rng)
+                    if callback is not None:
+                        callback(step, loss)
+                except Exception as e:
+                    state['error'] = e
+
+        if num_threads == 1:
+            worker(seeds[0])
+        else:
+            threads = [threading.Thread(target=worker, args=(seed,)) for seed in seeds]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        if state['error'] is not None:
+            raise state['error']
+        return state['step']
+
+    def similarity(self, x):
+        """
+        :param x: word indices
+        :return: cosine similarity between the embeddings of x and all embeddings, with shape (len(x), vocabulary)
+        """
+        norms = np.linalg.norm(self.embedding, axis=1, keepdims=True)
+        normalized = self.embedding / np.maximum(norms, 1e-12)
+        return normalized[x] @ normalized.T
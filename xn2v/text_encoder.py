@@ -7,7 +7,10 @@ import bz2
 from math import ceil
 
 from pandas.core.common import flatten
-from tensorflow.keras.preprocessing.text import text_to_word_sequence, Tokenizer
+try:
+    from tensorflow.keras.preprocessing.text import text_to_word_sequence, Tokenizer
+except ImportError:  # TensorFlow is needed for TextEncoder.build_dataset_with_keras
+    text_to_word_sequence = Tokenizer = None
 
 
 class TextEncoder:
@@ -265,6 +268,8 @@ class TextEncoder:
 
 
     def build_dataset_with_keras(self, max_vocab_size=50000):
+        if Tokenizer is None:
+            raise TypeError("build_dataset_with_keras requires TensorFlow")
         text = self.get_raw_text()
         words = text_to_word_sequence(text, lower=True, filters='\'!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n')
         words = self.remove_stopwords(words)
@@ -1,9 +1,30 @@
 import random
 import math
+import time
 import numpy as np
-import tensorflow as tf
 import collections
 
+try:
+    import tensorflow as tf
+except ImportError:  # TensorFlow is optional for SkipGramWord2Vec with backend='numpy'
+    tf = None
+
+from .corpus import BatchPrefetcher
+from .corpus import PAD
+from .corpus import SkipGramBatcherListOfLists
+from .corpus import cbow_examples
+from .corpus import keep_probabilities
+from .corpus import subsample_walks
+from .corpus import take_walks
+from .corpus import token_counts
+from .corpus import tokens_to_array
+from .corpus import window_count
+from .corpus import UnigramTable
+from .corpus import walks_to_array
+from .embeddings import save_embeddings
+from .instrumentation import instrumented
+from .sgns import SkipGramNegativeSampling
+
 
 class CBOWBatcherListOfLists:
     """
@@ -12,7 +33,8 @@ class CBOWBatcherListOfLists:
     This class is an implementation detail and should not be used outside of this file
     """
 
-    def __init__(self, data, window_size=2, sentences_per_batch=1):
+    def __init__(self, data, window_size=2, sentences_per_batch=1, num_buffers=2, subsample_threshold=None,
+                 shuffle=False, seed=None):
         """Setup Continuous Bag of Words Batch generation for data that is presented
         as a list of list of integers (as is typical for node2vec). Note that we generate
         batches that consist of all of the data from k windows, where k is at least one.
@@ -21,6 +43,13 @@ class CBOWBatcherListOfLists:
             data: a list of lists of integers, representing sentences/random walks
             window_size: size of sliding window for continuous bag of words
             sentences_per_batch: number of sentences to include in one batch
+            num_buffers: number of preallocated output buffers. A batch returned by generate_batch
+                is overwritten num_buffers calls later
+            subsample_threshold: if not None, frequent words are subsampled with this threshold
+                (see corpus.keep_probabilities). The batches then still have batch_size examples, which
+                are taken from as many (subsampled) sentences as needed
+            shuffle: if True, the order of the sentences is shuffled in each epoch (pass through all sentences)
+            seed: seed for the subsampling and shuffling
         """
         self.data = data
         self.window_size = window_size
@@ -48,63 +77,84 @@ class CBOWBatcherListOfLists:
         self.max_word_index = self.sentence_len - self.span + 1
         if self.sentence_count < 2:
             raise TypeError("Expected more than one sentence for CBOWBatcherListOfLists")
-
-    def get_next_sentence(self):
-        """Return the next sentence available for processing. Rotate to
-        the beginning of the dataset if we are at the end.
-        """
-        sentence = self.data[self.sentence_index]
-        self.sentence_index += 1
-        if self.sentence_index == self.sentence_count:
-            self.sentence_index = 0  # reset
-        return sentence
+        if num_buffers < 1:
+            raise TypeError("num_buffers must be at least 1")
+        self.walks = walks_to_array(self.data)
+        # Note that batch has span-1=2*window_size columns
+        self.buffers = [(np.empty((self.batch_size, self.span - 1), dtype=np.int32),
+                         np.empty((self.batch_size, 1), dtype=np.int64)) for _ in range(num_buffers)]
+        self.buffer_index = 0
+        self.keep_probabilities = None
+        if subsample_threshold is not None:
+            self.keep_probabilities = keep_probabilities(token_counts(self.walks), subsample_threshold)
+        self.rng = np.random.default_rng(seed)
+        self.shuffle = shuffle
+        self.epoch = 0  # number of completed passes through the sentences
+        # examples of the subsampled sentences that have not been used in a batch yet
+        self.contexts = np.empty((0, self.span - 1), dtype=np.int32)
+        self.targets = np.empty((0, 1), dtype=np.int64)
+        self.example_index = 0
 
     def generate_batch(self):
         """
-        Generate the next batch of data for CBOW
+        Generate the next batch of data for CBOW. The windows of the next sentences_per_batch sentences
+        are extracted at once (see cbow_examples) and written to the next output buffer. Only the output
+        is preallocated: the sentences (take_walks) and their windows are temporary copies of each call
 
         Returns:
             A batch CBOW data for training
         """
-        span = self.span
-        # two numpy arrays to hold target words (batch)
-        # and context words (labels)
-        # Note that batch has span-1=2*window_size columns
-        batch = np.ndarray(shape=(self.batch_size, span - 1), dtype=np.int32)
-        labels = np.ndarray(shape=(self.batch_size, 1), dtype=np.int64)
-
-        # The buffer holds the data contained within the span.
-        # The deque essentially implements a sliding window
-        buffer = collections.deque(maxlen=span)
-        target_idx = self.window_size  # target word index at the center of the buffer
-
-        for _ in range(self.sentences_per_batch):
-            sentence = self.get_next_sentence()
-            # buffer is a sliding window with span elements
-            buffer.extend(sentence[0:span-1])
-            word_index = span - 1  # go to end of sliding window
-            # For each batch index, we iterate through span elements
-            # to fill in the columns of batch array
-            for i in range(self.max_word_index):
-                # Put the next window into the buffer
-                buffer.append(sentence[word_index])
-                word_index = word_index + 1
-                col_idx = 0
-                for j in range(span):
-                    # if j == span // 2:
-                    if j == target_idx:
-                        continue  # i.e., ignore the center wortd
-                    batch[i, col_idx] = buffer[j]
-                    col_idx += 1
-                labels[i, 0] = buffer[target_idx]
-
+        batch, labels = self.buffers[self.buffer_index]
+        self.buffer_index = (self.buffer_index + 1) % len(self.buffers)
+        if self.keep_probabilities is None:
+            return cbow_examples(self.next_walks(), self.window_size, batch, labels)
+        filled = 0
+        empty_blocks = 0
+        while filled < self.batch_size:
+            if self.example_index == len(self.contexts):
+                # As in SkipGramBatcherListOfLists, give up if no block of a full pass through the sentences has
+                # a window
+                if empty_blocks == -(-self.sentence_count // self.sentences_per_batch):
+                    raise TypeError("No windows with window_size={} in a full pass through the subsampled "
+                                    "sentences (is subsample_threshold too low?)".format(self.window_size))
+                walks = subsample_walks(self.next_walks(), self.keep_probabilities, self.rng)
+                self.contexts, self.targets = cbow_examples(walks, self.window_size)
+                self.example_index = 0
+                empty_blocks = empty_blocks + 1 if len(self.contexts) == 0 else 0
+            n = min(self.batch_size - filled, len(self.contexts) - self.example_index)
+            batch[filled:filled + n] = self.contexts[self.example_index:self.example_index + n]
+            labels[filled:filled + n] = self.targets[self.example_index:self.example_index + n]
+            self.example_index += n
+            filled += n
         return batch, labels
 
+    def next_walks(self):
+        """Return the next sentences_per_batch sentences as a 2D array. Rotate to the beginning
+        of the dataset if we are at the end.
+        """
+        walks = take_walks(self.walks, self.sentence_index, self.sentences_per_batch)
+        self.sentence_index += self.sentences_per_batch
+        if self.sentence_index >= self.sentence_count:
+            self.sentence_index %= self.sentence_count
+            self.epoch += 1
+            if self.shuffle:
+                self.walks = self.walks[self.rng.permutation(self.sentence_count)]
+        return walks
+
+    def examples_per_epoch(self):
+        """
+        :return: the number of examples (windows) of one pass through the sentences (the expected number if the
+        sentences are subsampled)
+        """
+        return window_count(self.walks, self.span, self.keep_probabilities)
+
 
 class Word2Vec:
     """
     Superclass of all of the word2vec family algorithms.
     """
+    # With epochs, the learning rate decays linearly to this fraction of the initial learning rate (as in word2vec)
+    MIN_LEARNING_RATE_RATIO = 1e-4
 
     def __init__(self,
                  learning_rate=0.1,
@@ -116,7 +166,11 @@ class Word2Vec:
                  skip_window=3,
                  num_skips=2,
                  num_sampled=7,  # default=64
-                 display=None
+                 display=None,
+                 prefetch_depth=2,
+                 steps_per_call=1,
+                 subsample_threshold=None,
+                 epochs=None
                  ):
         """
         :param learning_rate:
@@ -128,6 +182,16 @@ class Word2Vec:
         :param skip_window: # How many words to consider left and right.
         :param num_skips: # How many times to reuse an input to generate a label.
         :param num_sampled: # Number of negative examples to sample.
+        :param prefetch_depth: number of batches that are generated ahead of training in a background thread
+        (0 to generate the batches synchronously)
+        :param steps_per_call: number of optimization steps that are run in one call of the compiled training loop.
+        The loss is reported (and the display words are evaluated) only after each chunk of steps_per_call steps
+        :param subsample_threshold: if not None, frequent words (e.g., hub nodes) of a list of lists (e.g., random
+        walks) are subsampled with this threshold t before the training examples are generated. A word with
+        frequency f > t is kept with probability (sqrt(f / t) + 1) * t / f. Typical values are 1e-5 to 1e-3
+        :param epochs: if not None, train for this number of passes through the corpus instead of num_steps steps.
+        The order of the walks is shuffled in each epoch, the words/sec of each epoch are reported, and the learning
+        rate decays linearly to MIN_LEARNING_RATE_RATIO * learning_rate over the training
         """
         self.learning_rate = learning_rate
         self.batch_size = batch_size
@@ -142,6 +206,17 @@ class Word2Vec:
         self.num_sampled = num_sampled
         self.display = display
         self.display_examples = []
+        self.prefetch_depth = prefetch_depth
+        if steps_per_call < 1:
+            raise TypeError("steps_per_call must be at least 1")
+        self.steps_per_call = steps_per_call
+        self.subsample_threshold = subsample_threshold
+        if epochs is not None and epochs < 1:
+            raise TypeError("epochs must be at least 1")
+        self.epochs = epochs
+        self.steps_per_epoch = None
+        self.words_per_epoch = None
+        self.epoch_start = None
 
     def add_display_words(self, count, num=5):
         '''
@@ -165,41 +240,163 @@ class Word2Vec:
         # This is to sample some less common words
         self.display_examples = np.append(valid_examples, random.sample(range(1000, 1000 + valid_window), num), axis=0)
 
-    def calculate_vocabulary_size(self):
+    def calculate_vocabulary_size(self, tokens=None):
         """
-        Calculate the vocabulary size
+        Calculate the vocabulary size, i.e., the number of distinct tokens plus one, with one np.bincount over the
+        int32 tokens of the corpus (rather than a set of all tokens of a flattened copy of the corpus)
+        :param tokens: int array of the corpus (see tokens_to_array). Converted from self.data if None
+        :return: the token counts (see token_counts)
         """
+        if tokens is None:
+            tokens = tokens_to_array(self.data)
+        counts = token_counts(tokens)
+        self.vocabulary_size = min(self.max_vocabulary_size, int(np.count_nonzero(counts)) + 1)
         # self.data is either a list (e.g., from a text) or a list of lists (e.g., from a collection of random walks)
-        if any(isinstance(el, list) for el in self.data):
-            flat_list = [item for sublist in self.data for item in sublist]
-            self.vocabulary_size = min(self.max_vocabulary_size, len(set(flat_list)) + 1)
+        if tokens.ndim == 2:
             print("Vocabulary size (list of lists) is %d" % self.vocabulary_size)
         else:
-            self.vocabulary_size = min(self.max_vocabulary_size, len(set(self.data)) + 1)
             print("Vocabulary size (flat) is %d" % self.vocabulary_size)
+        return counts
+
+    def next_training_batch(self):
+        """
+        :return: the next (batch, labels) training batch. Implemented by the subclasses
+        """
+        raise NotImplementedError
 
-    def write_embeddings(self, outfilename):
+    def setup_epochs(self, examples_per_epoch, examples_per_step, words_per_epoch):
+        """
+        Set the number of training steps for epoch-based training (if epochs is not None). Called by the subclasses
+        once the batches are set up
+        :param examples_per_epoch: number of training examples of one pass through the corpus
+        :param examples_per_step: number of training examples per batch
+        :param words_per_epoch: number of words (tokens) of the corpus
+        """
+        self.words_per_epoch = words_per_epoch
+        if self.epochs is None:
+            return
+        self.steps_per_epoch = max(1, examples_per_epoch // examples_per_step)
+        self.num_steps = self.epochs * self.steps_per_epoch
+
+    def learning_rate_at(self, step):
+        """
+        :param step: number of steps done so far
+        :return: the learning rate for the next step. With epochs, the learning rate decays linearly over the
+        training, i.e., over the total number of words, since every step covers the same number of examples
+        """
+        if self.epochs is None:
+            return self.learning_rate
+        return self.learning_rate * max(self.MIN_LEARNING_RATE_RATIO, 1.0 - step / self.num_steps)
+
+    def set_learning_rate(self, learning_rate):
+        self.learning_rate_variable.assign(learning_rate)
+
+    def report_epochs(self, previous_step, step):
+        """
+        With epochs, print the throughput (words/sec) when an epoch ended between previous_step and step
+        """
+        if self.steps_per_epoch is None:
+            return
+        if previous_step == 0:
+            self.epoch_start = time.perf_counter()
+        epoch, previous_epoch = step // self.steps_per_epoch, previous_step // self.steps_per_epoch
+        if epoch > previous_epoch:
+            now = time.perf_counter()
+            words_per_sec = (epoch - previous_epoch) * self.words_per_epoch / max(now - self.epoch_start, 1e-9)
+            print("epoch: %i, %.1f words/sec, learning rate: %f" % (epoch, words_per_sec, self.learning_rate_at(step)))
+            self.epoch_start = now
+
+    def apply_gradients(self, gradients, variables):
+        """
+        Apply one step of stochastic gradient descent. The gradients of the embedding lookups (of the embedding and
+        of the NCE/softmax weights and biases) are tf.IndexedSlices that only contain the rows referenced in the batch
+        (centers, contexts, and sampled negatives), and these rows are updated in place with scatter_sub, so that
+        the cost of a step scales with the batch size rather than with the size of the vocabulary
+        :param gradients: list of gradients, as returned by tf.GradientTape.gradient
+        :param variables: list of the corresponding variables
+        """
+        for gradient, variable in zip(gradients, variables):
+            if isinstance(gradient, tf.IndexedSlices):
+                # scatter_sub adds up the updates of indices that occur several times in the batch
+                variable.scatter_sub(tf.IndexedSlices(self.learning_rate_variable * gradient.values, gradient.indices))
+            else:
+                variable.assign_sub(self.learning_rate_variable * gradient)
+
+    def run_optimization_steps(self, batches_x, batches_y):
+        """
+        Run one optimization step for each of the stacked batches. Called within a tf.function, the loop is
+        compiled into a tf.while_loop, so that a chunk of steps costs a single Python call
+        :param batches_x: stacked batches, with shape (steps, ...) + shape of a batch
+        :param batches_y: stacked labels
+        :return: the loss of the last step
+        """
+        loss = tf.constant(0.0)
+        for i in tf.range(tf.shape(batches_x)[0]):
+            loss = self.run_optimization(batches_x[i], batches_y[i])
+        return loss
+
+    def compile_train_step(self, input_signature):
+        """
+        Compile run_optimization (self.train_step) and run_optimization_steps (self.train_steps) into graphs
+        that are traced only once for batches with the given signature
+        :param input_signature: list of tf.TensorSpec for the batch and the labels
+        """
+        self.train_step = tf.function(self.run_optimization, input_signature=input_signature)
+        chunk_signature = [tf.TensorSpec(shape=[None] + spec.shape.as_list(), dtype=spec.dtype)
+                           for spec in input_signature]
+        self.train_steps = tf.function(self.run_optimization_steps, input_signature=chunk_signature)
+
+    def next_training_chunk(self, step_count):
+        """
+        :param step_count: number of training steps
+        :return: the next step_count training batches and labels, stacked into two arrays
+        """
+        # The batches are views of the ring of output buffers of the batcher, which has fewer buffers than a chunk
+        # may have steps. Each batch is therefore copied into its slot before the next batch is generated
+        batch, labels = self.next_training_batch()
+        batches = np.empty((step_count,) + batch.shape, dtype=batch.dtype)
+        all_labels = np.empty((step_count,) + labels.shape, dtype=labels.dtype)
+        batches[0], all_labels[0] = batch, labels
+        for step in range(1, step_count):
+            batches[step], all_labels[step] = self.next_training_batch()
+        return batches, all_labels
+
+    def training_batches(self):
+        """
+        :return: BatchPrefetcher over the chunks of steps_per_call training batches (see next_training_chunk) for
+        the num_steps training steps, which are generated prefetch_depth chunks ahead of the optimization
+        in a background thread
+        """
+        chunk_sizes = [self.steps_per_call] * (self.num_steps // self.steps_per_call)
+        if self.num_steps % self.steps_per_call > 0:
+            chunk_sizes.append(self.num_steps % self.steps_per_call)
+        chunk_count = len(chunk_sizes)
+        chunk_sizes = iter(chunk_sizes)
+        return BatchPrefetcher(lambda: self.next_training_chunk(next(chunk_sizes)), chunk_count, self.prefetch_depth)
+
+    @instrumented('Word2Vec.write_embeddings', items=lambda self, _: len(self.id2word), unit='embeddings')
+    def write_embeddings(self, outfilename, file_format=None):
+        """
+        Write the embeddings of all words (nodes) of id2word
+        :param outfilename: output path
+        :param file_format: 'text' (tab-separated, the default), 'npy' (the matrix as .npy file and the labels in a
+        .labels file), or 'word2vec' (binary). If None, the format is inferred from the extension (.npy, .bin)
+        """
         if self.embedding is None:
             raise TypeError("Could not find self.embedding")
         if self.id2word is None:
             raise TypeError("Could not find self.id2word dictionary")
-        id_list = self.id2word.keys()
-        # id_list.sort() # TODO FIGURE OUT HOW TO SORT ME
-        fh = open(outfilename, "w")
-        with tf.device('/cpu:0'):
-            for idtf in id_list:
-                fh.write(self.id2word[idtf])
-                x_embed = tf.nn.embedding_lookup(self.embedding, idtf)
-                x = x_embed.numpy()
-                for it in x:
-                    fh.write("\t{}".format(it))
-                fh.write("\n")
+        id_list = list(self.id2word.keys())
+        # np.asarray copies a tf.Variable to a numpy array (and leaves the array of the numpy backend as it is)
+        embedding = np.asarray(self.embedding)
+        save_embeddings(outfilename, [self.id2word[idx] for idx in id_list], embedding[id_list], file_format)
 
 
 class SkipGramWord2Vec(Word2Vec):
     """
     Class to run word2vec using skip grams
     """
+    BACKENDS = ('tensorflow', 'numpy')
 
     def __init__(self,
                  data,
@@ -214,8 +411,35 @@ class SkipGramWord2Vec(Word2Vec):
                  skip_window=3,
                  num_skips=2,
                  num_sampled=7,  # default=64
-                 display=None
+                 display=None,
+                 prefetch_depth=2,
+                 steps_per_call=1,
+                 subsample_threshold=None,
+                 epochs=None,
+                 backend='tensorflow',
+                 num_threads=1,
+                 seed=None
                  ):
+        """
+        The arguments are those of Word2Vec, plus
+        :param data: a list of lists of integers (e.g., random walks from node2vec) or a list of integers
+        :param worddictionary: map from words (node labels) to their integer ids
+        :param reverse_worddictionary: map from integer ids to words (node labels)
+        :param backend: 'tensorflow' (NCE loss with TensorFlow) or 'numpy' (skip-gram with negative sampling
+        implemented with NumPy, see SkipGramNegativeSampling), which does not need TensorFlow
+        :param num_threads: number of Hogwild training threads of the numpy backend
+        :param seed: seed of the batches (choice of context words, subsampling, and shuffling) and of the numpy
+        backend (initialization and negative sampling)
+        """
+        if backend not in self.BACKENDS:
+            raise TypeError("backend must be one of {}".format(self.BACKENDS))
+        if backend == 'numpy' and steps_per_call != 1:
+            raise TypeError("steps_per_call requires backend='tensorflow' (the numpy backend has no compiled "
+                            "training loop)")
+        if backend == 'tensorflow' and tf is None:
+            raise TypeError("backend='tensorflow' requires TensorFlow, use backend='numpy' without TensorFlow")
+        self.backend = backend
+        self.num_threads = num_threads
         super(SkipGramWord2Vec, self).__init__(learning_rate,
                                                batch_size,
                                                num_steps,
@@ -225,34 +449,52 @@ class SkipGramWord2Vec(Word2Vec):
                                                skip_window,
                                                num_skips,
                                                num_sampled,
-                                               display)
+                                               display,
+                                               prefetch_depth,
+                                               steps_per_call,
+                                               subsample_threshold,
+                                               epochs)
         self.data = data
         self.word2id = worddictionary
         self.id2word = reverse_worddictionary
 
 
-        # takes the input data and goes through each element
-        if any(isinstance(el, list) for el in self.data):#check each element is a list
-            for el in self.data:
-              if any(isinstance(item, int) for item in el):#check each element of the list is integer
-                  self.list_of_lists = True  # graph version
-              else:
-                  self.list_of_lists = False
-                  raise TypeError("The item needs to be a list of walks where each walk is a sequence of (integer) nodes.")
-
-
-        self.calculate_vocabulary_size()
+        # takes the input data and checks that it is a list of walks of integer nodes (or a flat list of integers)
+        tokens = tokens_to_array(self.data)
+        self.list_of_lists = tokens.ndim == 2
+        counts = self.calculate_vocabulary_size(tokens)
         # This should not be a problem with real data, but with toy examples the number of nodes might be
         # lower than the default value of num_sampled of 64. However, num_sampled needs to be less than
         # the number of examples (num_sampled is the number of negative samples that get evaluated per positive example)
         if self.num_sampled > self.vocabulary_size:
-            self.num_sampled = self.vocabulary_size / 2
-        self.optimizer = tf.optimizers.SGD(learning_rate)
+            self.num_sampled = self.vocabulary_size // 2
         self.data_index = 0
-        self.current_sentence = 0
         self.num_sentences = len(self.data)
+        counts = np.pad(counts, (0, max(0, self.vocabulary_size - len(counts))))
+        if self.list_of_lists:
+            # The batcher keeps the walks as an int32 matrix and generates fixed-size batches of pairs
+            # With prefetching, the batches in the queue must not share a buffer with the batch that is generated
+            # and the batch that is retrieved for training (the training threads of the numpy backend copy it)
+            self.batcher = SkipGramBatcherListOfLists(tokens, batch_size=self.batch_size,
+                                                      skip_window=self.skip_window, num_skips=self.num_skips,
+                                                      num_buffers=self.prefetch_depth + 2,
+                                                      subsample_threshold=self.subsample_threshold,
+                                                      shuffle=self.epochs is not None, seed=seed)
+            self.setup_epochs(self.batcher.examples_per_epoch(), self.batch_size, int(np.sum(counts)))
+        else:
+            self.setup_epochs(len(self.data) * self.num_skips, self.batch_size, len(self.data))
+        # The negative examples are drawn from the unigram^0.75 distribution of the actual token counts. Note that
+        # the default log-uniform sampler of TensorFlow assumes that the ids are sorted by decreasing frequency,
+        # which is not the case for the (lexicographically sorted) node ids of CSFGraph
+        self.unigram_table = UnigramTable(counts[:self.vocabulary_size])
         # Do not display examples during training unless the user calls add_display_words, i.e., default is None
         self.display = None
+        if self.backend == 'numpy':
+            self.sgns = SkipGramNegativeSampling(self.vocabulary_size, embedding_size, learning_rate, self.num_sampled,
+                                                 unigram_table=self.unigram_table, seed=seed)
+            # The rows of the embedding are updated in place during training
+            self.embedding = self.sgns.embedding
+            return
         # Ensure the following ops & var are assigned on CPU
         # (some ops are not compatible on GPU).
         with tf.device('/cpu:0'):
@@ -263,6 +505,12 @@ class SkipGramWord2Vec(Word2Vec):
             # Construct the variables for the NCE loss.
             self.nce_weights = tf.Variable(tf.random.normal([self.vocabulary_size, embedding_size]))
             self.nce_biases = tf.Variable(tf.zeros([self.vocabulary_size]))
+            self.learning_rate_variable = tf.Variable(learning_rate, trainable=False, dtype=tf.float32)
+            self.sampling_cumulative = tf.constant(self.unigram_table.cumulative, dtype=tf.float64)
+            self.sampling_probabilities = tf.constant(self.unigram_table.probabilities, dtype=tf.float32)
+        # The training step is traced once into a graph for fixed-size batches of batch_size pairs
+        self.compile_train_step([tf.TensorSpec(shape=[self.batch_size], dtype=tf.int32),
+                                 tf.TensorSpec(shape=[self.batch_size, 1], dtype=tf.int32)])
 
     def get_embedding(self, x):
         '''
@@ -277,6 +525,19 @@ class SkipGramWord2Vec(Word2Vec):
             x_embed = tf.nn.embedding_lookup(self.embedding, x)
             return x_embed
 
+    def sample_negatives(self, y):
+        """
+        Draw num_sampled negative examples for the batch from the unigram distribution (see UnigramTable)
+        :param y: labels (context words) with shape (batch_size, 1)
+        :return: the sampled_values argument of tf.nn.nce_loss, i.e., the sampled ids and the expected counts of
+        the labels and of the sampled ids
+        """
+        uniform = tf.random.uniform([self.num_sampled], dtype=tf.float64)
+        sampled = tf.searchsorted(self.sampling_cumulative, uniform, side='right', out_type=tf.int64)
+        true_expected_count = self.num_sampled * tf.gather(self.sampling_probabilities, y)
+        sampled_expected_count = self.num_sampled * tf.gather(self.sampling_probabilities, sampled)
+        return sampled, true_expected_count, sampled_expected_count
+
     def nce_loss(self, x_embed, y):
         with tf.device('/cpu:0'):
             # Compute the average NCE loss for the batch.
@@ -297,7 +558,8 @@ class SkipGramWord2Vec(Word2Vec):
                                labels=y,
                                inputs=x_embed,
                                num_sampled=self.num_sampled,
-                               num_classes=self.vocabulary_size))
+                               num_classes=self.vocabulary_size,
+                               sampled_values=self.sample_negatives(y)))
             return loss
 
     # Evaluation.
@@ -315,7 +577,7 @@ class SkipGramWord2Vec(Word2Vec):
         """
         Generate training batch for the skip-gram model. This assumes that all of the data is in one
         and only one list (for instance, the data might derive from a book). To get batches
-        from a list of lists (e.g., node2vec), use the 'next_batch_from_list_of_list' function
+        from a list of lists (e.g., node2vec), see self.batcher (SkipGramBatcherListOfLists)
         :param batch_size:
         :param num_skips:
         :param skip_window:
@@ -355,37 +617,13 @@ class SkipGramWord2Vec(Word2Vec):
         self.data_index = (self.data_index + len(data) - span) % len(data)
         return batch, labels
 
-    def next_batch_from_list_of_lists(self, walk_count, num_skips, skip_window):
+    def next_training_batch(self):
         """
-        Generate training batch for the skip-gram model. This assumes that all of the data is in one
-        and only one list (for instance, the data might derive from a book). To get batches
-        from a list of lists (e.g., node2vec), use the 'next_batch_from_list_of_list' function
-        :param walk_count: number of walks (sublists or sentences) to ingest
-        :param num_skips: The number of data points to extract for each center node
-        :param skip_window: The size of the surrounding window (For instance, if skip_window=2 and num_skips=1,
-        we look at 5 nodes at a time, and choose one data point from the 4 nodes that surround the center node
-        :return: A batch of data points ready for learning
+        :return: the next batch of batch_size (center, context) pairs
         """
-        # assert batch_size % num_skips == 0
-        assert num_skips <= 2 * skip_window
-        # self.data is a list of lists, e.g., [[1, 2, 3], [5, 6, 7]]
-        span = 2 * skip_window + 1
-        batch = np.ndarray(shape=0, dtype=np.int32)
-        labels = np.ndarray(shape=(0, 1), dtype=np.int32)
-        for i in range(walk_count):
-            # here, sentence can be one random walk
-            sentence = self.data[self.current_sentence]
-            self.current_sentence += 1
-            sentence_len = len(sentence)
-            batch_count = sentence_len - span + 1
-            current_batch, current_labels = self.next_batch(sentence, batch_count, num_skips, skip_window)
-            batch = np.append(batch, current_batch)
-            labels = np.append(labels, current_labels, axis=0)
-            if self.current_sentence == self.num_sentences:
-                self.current_sentence = 0
-        return batch, labels
-
-        # get window size (words left and right + current one).
+        if self.list_of_lists:
+            return self.batcher.generate_batch()
+        return self.next_batch(self.data, self.batch_size, self.num_skips, self.skip_window)
 
     # Optimization process.
     def run_optimization(self, x, y):
@@ -399,9 +637,42 @@ class SkipGramWord2Vec(Word2Vec):
             gradients = g.gradient(loss, [self.embedding, self.nce_weights, self.nce_biases])
 
             # Update W and b following gradients.
-            self.optimizer.apply_gradients(zip(gradients, [self.embedding, self.nce_weights, self.nce_biases]))
+            self.apply_gradients(gradients, [self.embedding, self.nce_weights, self.nce_biases])
+            return loss
 
+    def train_numpy(self, display_step=2000):
+        """
+        Train with the NumPy engine (backend='numpy'). The batches are prefetched in a background thread and
+        distributed over num_threads training threads. As with TensorFlow, the loss is printed every display_step
+        steps and the display words are evaluated every eval_step steps
+        """
+        if display_step is not None:
+            for w in self.display_examples:
+                print("{}: id={}".format(self.id2word[w], w))
+
+        def show_progress(step, loss):
+            self.set_learning_rate(self.learning_rate_at(step))
+            if display_step is not None and (step % display_step == 0 or step == 1):
+                print("step: %i, loss: %f" % (step, loss))
+            if self.display is not None and (step % self.eval_step == 0 or step == 1):
+                print("Evaluation...")
+                self.print_nearest(self.sgns.similarity(np.asarray(self.display_examples, dtype=np.int64)))
+            self.report_epochs(step - 1, step)
+
+        with BatchPrefetcher(self.next_training_batch, self.num_steps, self.prefetch_depth) as batches:
+            self.sgns.train(batches, num_threads=self.num_threads, callback=show_progress)
+
+    def set_learning_rate(self, learning_rate):
+        if self.backend == 'numpy':
+            self.sgns.learning_rate = learning_rate
+        else:
+            self.learning_rate_variable.assign(learning_rate)
+
+    @instrumented('SkipGramWord2Vec.train', items=lambda self, _: self.num_steps, unit='steps')
     def train(self, display_step=2000):
+        if self.backend == 'numpy':
+            self.train_numpy(display_step)
+            return
         # Words for testing.
         # display_step = 2000
         # eval_step = 2000
@@ -412,31 +683,40 @@ class SkipGramWord2Vec(Word2Vec):
         x_test = np.array(self.display_examples)
 
         # Run training for the given number of steps.
-        for step in range(1, self.num_steps + 1):
-            if self.list_of_lists:
-                walkcount = 2
-                batch_x, batch_y = self.next_batch_from_list_of_lists(walkcount, self.num_skips, self.skip_window)
-            else:
-                batch_x, batch_y = self.next_batch(self.data, self.batch_size, self.num_skips, self.skip_window)
-            self.run_optimization(batch_x, batch_y)
-
-            if step % display_step == 0 or step == 1:
-                loss = self.nce_loss(self.get_embedding(batch_x), batch_y)
-                print("step: %i, loss: %f" % (step, loss))
-
-            # Evaluation.
-            if not self.display is None and (step % self.eval_step == 0 or step == 1):
-                print("Evaluation...")
-                sim = self.evaluate(self.get_embedding(x_test)).numpy()
-                print(sim[0])
-                for i in range(len(self.display_examples)):
-                    top_k = 8  # number of nearest neighbors.
-                    nearest = (-sim[i, :]).argsort()[1:top_k + 1]
-                    disp_example = self.id2word[self.display_examples[i]]
-                    log_str = '"%s" nearest neighbors:' % disp_example
-                    for k in range(top_k):
-                        log_str = '%s %s,' % (log_str, self.id2word[nearest[k]])
-                    print(log_str)
+        with self.training_batches() as batches:
+            step = 0
+            for batches_x, batches_y in batches:
+                self.set_learning_rate(self.learning_rate_at(step))
+                # Run the steps of the chunk (steps_per_call steps) in one call of the compiled training loop
+                loss = self.train_steps(batches_x, batches_y)
+                previous_step, step = step, step + len(batches_x)
+                self.report_epochs(previous_step, step)
+
+                if step // display_step > previous_step // display_step or previous_step == 0:
+                    print("step: %i, loss: %f" % (step, loss))
+
+                # Evaluation.
+                if not self.display is None and (step // self.eval_step > previous_step // self.eval_step
+                                                 or previous_step == 0):
+                    print("Evaluation...")
+                    sim = self.evaluate(self.get_embedding(x_test)).numpy()
+                    print(sim[0])
+                    self.print_nearest(sim)
+
+    def print_nearest(self, sim, top_k=8):
+        """
+        Print the nearest neighbors of the display words
+        :param sim: cosine similarities of the display words (rows) to all words (columns)
+        :param top_k: number of nearest neighbors
+        """
+        for i in range(len(self.display_examples)):
+            # the vocabulary may have ids without a word (e.g., the extra id of calculate_vocabulary_size)
+            nearest = [idx for idx in (-sim[i, :]).argsort()[1:] if idx in self.id2word][:top_k]
+            disp_example = self.id2word[self.display_examples[i]]
+            log_str = '"%s" nearest neighbors:' % disp_example
+            for idx in nearest:
+                log_str = '%s %s,' % (log_str, self.id2word[idx])
+            print(log_str)
 
 
 class ContinuousBagOfWordsWord2Vec(Word2Vec):
@@ -457,8 +737,14 @@ class ContinuousBagOfWordsWord2Vec(Word2Vec):
                  skip_window=3,
                  num_skips=2,
                  num_sampled=7,  # default=64
-                 display=None
+                 display=None,
+                 prefetch_depth=2,
+                 steps_per_call=1,
+                 subsample_threshold=None,
+                 epochs=None
                  ):
+        if tf is None:
+            raise TypeError("ContinuousBagOfWordsWord2Vec requires TensorFlow")
         super(ContinuousBagOfWordsWord2Vec, self).__init__(learning_rate,
                                                            batch_size,
                                                            num_steps,
@@ -468,22 +754,32 @@ class ContinuousBagOfWordsWord2Vec(Word2Vec):
                                                            skip_window,
                                                            num_skips,
                                                            num_sampled,
-                                                           display)
+                                                           display,
+                                                           prefetch_depth,
+                                                           steps_per_call,
+                                                           subsample_threshold,
+                                                           epochs)
         self.data = data
         self.word2id = worddictionary
         self.id2word = reverse_worddictionary
-        self.batcher = CBOWBatcherListOfLists(data)
         if any(isinstance(el, list) for el in self.data):
             self.list_of_lists = True
+            # The context of each window has 2*skip_window words (see get_embedding)
+            self.batcher = CBOWBatcherListOfLists(data, window_size=self.skip_window,
+                                                  num_buffers=self.prefetch_depth + 2,
+                                                  subsample_threshold=self.subsample_threshold,
+                                                  shuffle=self.epochs is not None)
+            self.setup_epochs(self.batcher.examples_per_epoch(), self.batcher.batch_size,
+                              int(np.count_nonzero(self.batcher.walks != PAD)))
         else:
             self.list_of_lists = False
-        self.calculate_vocabulary_size()
+            self.setup_epochs(len(self.data), self.batch_size, len(self.data))
+        self.calculate_vocabulary_size(self.batcher.walks if self.list_of_lists else None)
         # This should not be a problem with real data, but with toy examples the number of nodes might be
         # lower than the default value of num_sampled of 64. However, num_sampled needs to be less than
         # the number of examples (num_sampled is the number of negative samples that get evaluated per positive example)
         if self.num_sampled > self.vocabulary_size:
-            self.num_sampled = self.vocabulary_size / 2
-        self.optimizer = tf.optimizers.SGD(learning_rate)
+            self.num_sampled = self.vocabulary_size // 2
         self.data_index = 0
         self.current_sentence = 0
         self.num_sentences = len(self.data)
@@ -506,6 +802,13 @@ class ContinuousBagOfWordsWord2Vec(Word2Vec):
                                                                           stddev=0.5 / math.sqrt(embedding_size),
                                                                           dtype=tf.float32))
             self.softmax_biases = tf.Variable(tf.random.uniform([self.vocabulary_size], 0.0, 0.01))
+            self.learning_rate_variable = tf.Variable(learning_rate, trainable=False, dtype=tf.float32)
+        # The training step is traced once into a graph for fixed-size batches (for a list of lists, all the
+        # windows of sentences_per_batch sentences)
+        example_count = self.batcher.batch_size if self.list_of_lists else self.batch_size
+        self.compile_train_step(
+            [tf.TensorSpec(shape=[example_count, 2 * self.skip_window], dtype=tf.int32),
+             tf.TensorSpec(shape=[example_count, 1], dtype=tf.int64)])
 
     def get_embedding(self, x):
         '''
@@ -516,21 +819,9 @@ class ContinuousBagOfWordsWord2Vec(Word2Vec):
         The dimension of x is (batchsize, 2*skip_window), e.g., (128,6)
         Note that x does not contain the middle word
         '''
-        stacked_embedings = None
-        # print('Defining %d embedding lookups representing each word in the context' % (2 * self.skip_window))
-        for i in range(2 * self.skip_window):
-            embedding_i = tf.nn.embedding_lookup(self.embedding, x[:, i])
-            # print("embedding_i shape", embedding_i.shape)
-            x_size, y_size = embedding_i.get_shape().as_list()  # added ',_' -- is this correct?
-            if stacked_embedings is None:
-                stacked_embedings = tf.reshape(embedding_i, [x_size, y_size, 1])
-            else:
-                stacked_embedings = tf.concat(axis=2, values=[stacked_embedings,
-                                                              tf.reshape(embedding_i, [x_size, y_size, 1])])
-        assert stacked_embedings.get_shape().as_list()[2] == 2 * self.skip_window
-        # print("Stacked embedding size: %s" % stacked_embedings.get_shape().as_list())
-        mean_embeddings = tf.reduce_mean(stacked_embedings, 2, keepdims=False)
-        # print("Reduced mean embedding size: %s" % mean_embeddings.get_shape().as_list())
+        # embeddings of the context words, with shape (batchsize, 2*skip_window, embedding_dimension)
+        context_embeddings = tf.nn.embedding_lookup(self.embedding, x)
+        mean_embeddings = tf.reduce_mean(context_embeddings, 1, keepdims=False)
         return mean_embeddings
 
     def get_loss(self, mean_embeddings, y):
@@ -654,6 +945,15 @@ class ContinuousBagOfWordsWord2Vec(Word2Vec):
 
         # get window size (words left and right + current one).
 
+    def next_training_batch(self):
+        """
+        :return: the next batch of (context, target) examples. For a list of lists (e.g., node2vec), the batch
+        consists of all of the windows of the next sentences (see CBOWBatcherListOfLists)
+        """
+        if self.list_of_lists:
+            return self.batcher.generate_batch()
+        return self.generate_batch_cbow(self.data, self.batch_size, self.skip_window)
+
     # Optimization process.
     def run_optimization(self, x, y):
         with tf.device('/cpu:0'):
@@ -666,8 +966,10 @@ class ContinuousBagOfWordsWord2Vec(Word2Vec):
             gradients = g.gradient(loss, [self.embedding, self.softmax_weights, self.softmax_biases])
 
             # Update W and b following gradients.
-            self.optimizer.apply_gradients(zip(gradients, [self.embedding, self.softmax_weights, self.softmax_biases]))
+            self.apply_gradients(gradients, [self.embedding, self.softmax_weights, self.softmax_biases])
+            return loss
 
+    @instrumented('ContinuousBagOfWordsWord2Vec.train', items=lambda self, _: self.num_steps, unit='steps')
     def train(self, display_step=2000):
         # Words for testing.
         # display_step = 2000
@@ -679,24 +981,29 @@ class ContinuousBagOfWordsWord2Vec(Word2Vec):
         x_test = np.array(self.display_examples)
 
         # Run training for the given number of steps.
-        for step in range(1, self.num_steps + 1):
-            batch_x, batch_y = self.generate_batch_cbow(self.data, self.batch_size, self.skip_window)
-            self.run_optimization(batch_x, batch_y)
-
-            if step % display_step == 0 or step == 1:
-                loss = self.get_loss(self.get_embedding(batch_x), batch_y)
-                print("step: %i, loss: %f" % (step, loss))
-
-            # Evaluation.
-            if not self.display is None and (step % self.eval_step == 0 or step == 1):
-                print("Evaluation...")
-                sim = self.evaluate(self.get_embedding(x_test)).numpy()
-                print(sim[0])
-                for i in range(len(self.display_examples)):
-                    top_k = 8  # number of nearest neighbors.
-                    nearest = (-sim[i, :]).argsort()[1:top_k + 1]
-                    disp_example = self.id2word[self.display_examples[i]]
-                    log_str = '"%s" nearest neighbors:' % disp_example
-                    for k in range(top_k):
-                        log_str = '%s %s,' % (log_str, self.id2word[nearest[k]])
-                    print(log_str)
+        with self.training_batches() as batches:
+            step = 0
+            for batches_x, batches_y in batches:
+                self.set_learning_rate(self.learning_rate_at(step))
+                # Run the steps of the chunk (steps_per_call steps) in one call of the compiled training loop
+                loss = self.train_steps(batches_x, batches_y)
+                previous_step, step = step, step + len(batches_x)
+                self.report_epochs(previous_step, step)
+
+                if step // display_step > previous_step // display_step or previous_step == 0:
+                    print("step: %i, loss: %f" % (step, loss))
+
+                # Evaluation.
+                if not self.display is None and (step // self.eval_step > previous_step // self.eval_step
+                                                 or previous_step == 0):
+                    print("Evaluation...")
+                    sim = self.evaluate(self.get_embedding(x_test)).numpy()
+                    print(sim[0])
+                    for i in range(len(self.display_examples)):
+                        top_k = 8  # number of nearest neighbors.
+                        nearest = (-sim[i, :]).argsort()[1:top_k + 1]
+                        disp_example = self.id2word[self.display_examples[i]]
+                        log_str = '"%s" nearest neighbors:' % disp_example
+                        for k in range(top_k):
+                            log_str = '%s %s,' % (log_str, self.id2word[nearest[k]])
+                        print(log_str)